@@ -0,0 +1,195 @@
+-- Performance - Database Migration SQL
+-- Run this in Supabase SQL Editor (after 3_TIER_CACHE_MIGRATION.sql)
+
+-- =====================================================
+-- STUDENT_PROFICIENCIES: UNIQUE (student_id, concept_name)
+-- =====================================================
+
+-- Lets update_user_proficiency upsert on the natural key without first
+-- selecting row ids. Drop duplicate rows (keeping the most recently updated
+-- one) so the constraint can be added.
+DELETE FROM student_proficiencies sp
+USING student_proficiencies newer
+WHERE sp.student_id = newer.student_id
+  AND sp.concept_name = newer.concept_name
+  AND (COALESCE(sp.updated_at, 'epoch'), sp.id::text)
+    < (COALESCE(newer.updated_at, 'epoch'), newer.id::text);
+
+ALTER TABLE student_proficiencies
+  DROP CONSTRAINT IF EXISTS uq_student_proficiencies_student_concept;
+
+ALTER TABLE student_proficiencies
+  ADD CONSTRAINT uq_student_proficiencies_student_concept UNIQUE (student_id, concept_name);
+
+-- =====================================================
+-- QUESTIONS.POOL_ID: UUID -> VARCHAR
+-- =====================================================
+
+-- Tier 2 pool ids are question_pools.id ("level_level_id", VARCHAR), not UUIDs,
+-- so pool_questions() and invalidate_pool compare pool_id with VARCHAR values.
+-- Uploaded pools keep their uuid ids as text; on a schema that already has
+-- VARCHAR this is a no-op. idx_questions_pool_id is rebuilt with the column.
+ALTER TABLE questions
+  ALTER COLUMN pool_id TYPE VARCHAR USING pool_id::text;
+
+-- =====================================================
+-- QUESTION_POOLS -> QUESTIONS: EMBEDDABLE RELATIONSHIP
+-- =====================================================
+
+-- Computed relationship so PostgREST can embed a pool's questions in the
+-- question_pools select (`select=*,pool_questions(...)`), one request instead of
+-- two. A function rather than a foreign key: questions uploaded through
+-- store_questions belong to pools that have no question_pools row.
+CREATE OR REPLACE FUNCTION pool_questions(question_pools)
+RETURNS SETOF questions
+LANGUAGE sql STABLE
+AS $$
+  SELECT * FROM questions WHERE pool_id = $1.id
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_questions_pool_id ON questions(pool_id);
+
+-- =====================================================
+-- INVALIDATE POOL FUNCTION (one RPC, one transaction)
+-- =====================================================
+
+-- Deletes a pool's questions and its metadata together, so invalidation is a
+-- single request and never leaves questions without their pool row (or back)
+CREATE OR REPLACE FUNCTION invalidate_pool(p_id VARCHAR)
+RETURNS VOID AS $$
+BEGIN
+  DELETE FROM questions WHERE pool_id = p_id;
+  DELETE FROM question_pools WHERE id = p_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- QUESTION_POOLS.EXPIRES_AT: VARCHAR -> TIMESTAMPTZ
+-- =====================================================
+
+-- Lets reads filter expired pools in Postgres (expires_at > now) instead of
+-- fetching the row and comparing a unix-seconds string in Python. The view
+-- depends on the column, so it is dropped and recreated around the change.
+DROP VIEW IF EXISTS v_cache_statistics;
+
+ALTER TABLE question_pools
+  ALTER COLUMN expires_at TYPE TIMESTAMPTZ
+  USING to_timestamp(CAST(NULLIF(expires_at, '') AS NUMERIC));
+
+CREATE OR REPLACE VIEW v_cache_statistics AS
+SELECT
+  COUNT(*) as total_pools,
+  SUM(total_questions) as total_questions_cached,
+  COUNT(CASE WHEN expires_at < NOW() THEN 1 END) as expired_pools,
+  COUNT(CASE WHEN level = 'topic' THEN 1 END) as topic_pools,
+  COUNT(CASE WHEN level = 'chapter' THEN 1 END) as chapter_pools,
+  COUNT(CASE WHEN level = 'subject' THEN 1 END) as subject_pools,
+  COUNT(CASE WHEN level = 'class' THEN 1 END) as class_pools,
+  COUNT(CASE WHEN level = 'exam' THEN 1 END) as exam_pools,
+  AVG(total_questions)::DECIMAL(10,2) as avg_questions_per_pool,
+  MAX(cached_at) as last_cache_update
+FROM question_pools;
+
+-- Expired pools are no longer deleted on read; this (or pg_cron) removes them
+CREATE OR REPLACE FUNCTION cleanup_expired_question_pools()
+RETURNS INTEGER AS $$
+DECLARE
+  deleted_count INTEGER;
+BEGIN
+  DELETE FROM questions
+  WHERE pool_id IN (SELECT id FROM question_pools WHERE expires_at < NOW());
+
+  DELETE FROM question_pools
+  WHERE expires_at < NOW();
+
+  GET DIAGNOSTICS deleted_count = ROW_COUNT;
+
+  RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- SUBMIT RESPONSE FUNCTION (one RPC per answer)
+-- =====================================================
+
+-- Everything a submitted answer writes, in one request and one transaction:
+-- the response row, the student's proficiency upsert (needs
+-- uq_student_proficiencies_student_concept above) and the session's
+-- last_activity. Replaces three separate requests on the submit path.
+CREATE OR REPLACE FUNCTION submit_response(
+  p_student_id VARCHAR,
+  p_session_id UUID,
+  p_question_id VARCHAR,
+  p_response INT,
+  p_proficiency_before JSONB,
+  p_proficiency_after JSONB,
+  p_concept_names TEXT[],
+  p_proficiency_values FLOAT8[]
+)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO test_responses (student_id, session_id, question_id, response, is_correct,
+                              proficiency_before, proficiency_after, timestamp)
+  VALUES (p_student_id, p_session_id, p_question_id, p_response, p_response = 1,
+          p_proficiency_before, p_proficiency_after, NOW());
+
+  INSERT INTO student_proficiencies (student_id, concept_name, proficiency_value, updated_at)
+  SELECT p_student_id, c.concept_name, c.proficiency_value, NOW()
+  FROM unnest(p_concept_names, p_proficiency_values) AS c(concept_name, proficiency_value)
+  ON CONFLICT (student_id, concept_name)
+  DO UPDATE SET proficiency_value = EXCLUDED.proficiency_value,
+                updated_at = EXCLUDED.updated_at;
+
+  UPDATE test_sessions SET last_activity = NOW() WHERE id = p_session_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =====================================================
+-- COVERING INDEXES
+-- =====================================================
+
+-- get_learning_progress: completed sessions of one student in completed_at
+-- order, answered from the index alone (completed rows are no longer updated,
+-- so their heap pages stay all-visible for index-only scans)
+CREATE INDEX IF NOT EXISTS idx_test_sessions_student_status_completed
+  ON test_sessions(student_id, status, completed_at DESC)
+  INCLUDE (final_proficiency, accuracy, total_questions);
+
+-- questions keep the plain idx_questions_pool_id: every pool read needs content
+-- and options too, which are too large to INCLUDE, so no read would be index-only.
+
+-- student_proficiencies is already served by uq_student_proficiencies_student_concept.
+-- proficiency_value is deliberately not INCLUDEd: it changes on every submitted
+-- answer, so covering it would rule out HOT updates and keep pages from
+-- staying all-visible, costing more on writes than it saves on reads.
+
+-- =====================================================
+-- ROLLBACK PLAN (if needed)
+-- =====================================================
+
+-- To rollback this migration, run:
+/*
+DROP INDEX IF EXISTS idx_test_sessions_student_status_completed;
+
+DROP FUNCTION IF EXISTS submit_response(VARCHAR, UUID, VARCHAR, INT, JSONB, JSONB, TEXT[], FLOAT8[]);
+
+-- expires_at back to unix seconds (recreate v_cache_statistics and
+-- cleanup_expired_question_pools from 3_TIER_CACHE_MIGRATION.sql afterwards)
+DROP VIEW IF EXISTS v_cache_statistics;
+ALTER TABLE question_pools
+  ALTER COLUMN expires_at TYPE VARCHAR USING EXTRACT(EPOCH FROM expires_at)::TEXT;
+
+DROP FUNCTION IF EXISTS invalidate_pool(VARCHAR);
+DROP FUNCTION IF EXISTS pool_questions(question_pools);
+-- pool_id back to UUID: only possible once no Tier 2 ("level_level_id") rows remain
+ALTER TABLE questions
+  ALTER COLUMN pool_id TYPE UUID USING pool_id::uuid;
+ALTER TABLE student_proficiencies DROP CONSTRAINT IF EXISTS uq_student_proficiencies_student_concept;
+*/
+
+-- =====================================================
+-- MIGRATION COMPLETE
+-- =====================================================
+
+-- Verify migration
+SELECT 'Migration completed successfully!' as status;
@@ -8,17 +8,40 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     VERSION = os.getenv('APP_VERSION', '0.1.0')
+    HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', 2))  # seconds between backend probes
 
     # Supabase
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY')
     SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+    # Bulk inserts (question uploads) are split into requests of this many rows
+    SUPABASE_INSERT_CHUNK_SIZE = int(os.getenv('SUPABASE_INSERT_CHUNK_SIZE', 500))
+    # PostgREST max-rows cap; batched selects are split so no response gets truncated
+    SUPABASE_MAX_ROWS = int(os.getenv('SUPABASE_MAX_ROWS', 1000))
+    SUPABASE_IO_WORKERS = int(os.getenv('SUPABASE_IO_WORKERS', 8))  # threads for overlapping writes
+    # Pooled HTTP client behind PostgREST
+    SUPABASE_HTTP_MAX_CONNECTIONS = int(os.getenv('SUPABASE_HTTP_MAX_CONNECTIONS', 60))
+    SUPABASE_HTTP_KEEPALIVE = int(os.getenv('SUPABASE_HTTP_KEEPALIVE', 40))  # idle connections kept open
+    SUPABASE_HTTP_TIMEOUT = float(os.getenv('SUPABASE_HTTP_TIMEOUT', 10))  # seconds
+    SUPABASE_HTTP_RETRIES = int(os.getenv('SUPABASE_HTTP_RETRIES', 3))  # connect retries only
+    # Request-level retries of transient errors (jittered exponential backoff)
+    SUPABASE_RETRY_ATTEMPTS = int(os.getenv('SUPABASE_RETRY_ATTEMPTS', 3))
+    SUPABASE_RETRY_BASE_DELAY = float(os.getenv('SUPABASE_RETRY_BASE_DELAY', 0.1))  # seconds
+    # Direct Postgres connection (Supabase connection string) for COPY bulk loads;
+    # unset keeps every write on PostgREST
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    SUPABASE_COPY_MIN_ROWS = int(os.getenv('SUPABASE_COPY_MIN_ROWS', 500))  # smaller loads upsert
+    # 'transaction' for the Supavisor/pgbouncer transaction pooler (port 6543), which
+    # cannot keep server-side prepared statements; 'session' for port 5432
+    SUPABASE_POOLER_MODE = os.getenv('SUPABASE_POOLER_MODE', 'transaction').lower()
 
     # Redis
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_POOL_TIMEOUT = int(os.getenv('REDIS_POOL_TIMEOUT', 2))  # seconds to wait for a free connection
 
     # Session
     SESSION_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', 3600))  # 1 hour
@@ -32,7 +55,20 @@ class Config:
     EXTERNAL_API_URL = os.getenv('EXTERNAL_API_URL', 'https://api.example.com')
     EXTERNAL_API_KEY = os.getenv('EXTERNAL_API_KEY', '')
     EXTERNAL_API_TIMEOUT = int(os.getenv('EXTERNAL_API_TIMEOUT', 30))  # seconds
+    EXTERNAL_API_PAGE_WORKERS = int(os.getenv('EXTERNAL_API_PAGE_WORKERS', 8))  # concurrent page fetches
 
     # Cache Configuration
     REDIS_QUESTION_POOL_TTL = int(os.getenv('REDIS_QUESTION_POOL_TTL', 86400))  # 24 hours
+    REDIS_COMPRESS_MIN_BYTES = int(os.getenv('REDIS_COMPRESS_MIN_BYTES', 102400))  # zstd pool payloads above this
     SUPABASE_CACHE_EXPIRY = int(os.getenv('SUPABASE_CACHE_EXPIRY', 604800))  # 7 days
+    # JSON list of {"level": ..., "level_id": ...} pools each worker warms at boot
+    WARMUP_POOLS = os.getenv('WARMUP_POOLS', '[]')
+    WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 8))  # pools warmed in parallel
+
+    # Process-local L1 cache (per worker, in front of Redis/Supabase)
+    L1_POOL_TTL = int(os.getenv('L1_POOL_TTL', 300))  # seconds
+    L1_POOL_MAXSIZE = int(os.getenv('L1_POOL_MAXSIZE', 256))
+    L1_QUESTION_TTL = int(os.getenv('L1_QUESTION_TTL', 30))  # seconds
+    L1_QUESTION_MAXSIZE = int(os.getenv('L1_QUESTION_MAXSIZE', 16384))
+    L1_STUDENT_TTL = int(os.getenv('L1_STUDENT_TTL', 300))  # seconds
+    L1_STUDENT_MAXSIZE = int(os.getenv('L1_STUDENT_MAXSIZE', 4096))
@@ -0,0 +1,28 @@
+# app/gunicorn_conf.py - Gunicorn server hooks
+import json
+import logging
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def post_worker_init(worker):
+    """Warm this worker's caches before it accepts traffic"""
+    try:
+        pools = json.loads(Config.WARMUP_POOLS)
+        if not pools:
+            return
+
+        from main import cache_manager
+        results = cache_manager.warmup_cache([(p['level'], p['level_id']) for p in pools])
+        logger.info(f"Worker {worker.pid} warmup: {results['success']} success, {results['failed']} failed")
+    except Exception as e:
+        logger.error(f"Worker {worker.pid} cache warmup failed: {str(e)}")
+
+def worker_exit(server, worker):
+    """Close pooled Supabase connections as the worker stops"""
+    try:
+        from services.supabase_service import get_supabase_service
+        get_supabase_service().close()
+    except Exception as e:
+        logger.error(f"Worker {worker.pid} Supabase shutdown failed: {str(e)}")
@@ -1,15 +1,18 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request
 from flask_cors import CORS
+import time
 import logging
 import uuid
+import orjson
+import numpy as np
 from datetime import datetime
+from types import SimpleNamespace
 
 from services.redis_service import RedisService
 from services.question_service import QuestionService
-from services.supabase_service import SupabaseService
+from services.supabase_service import get_supabase_service
 from services.external_api_service import ExternalAPIService
 from services.cache_manager import CacheManager
-from services.scheduler import SessionCleanupScheduler
 from models.adaptive_engine import AdaptiveEngine
 from config import Config
 
@@ -17,13 +20,17 @@ from config import Config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Settings are resolved from the environment once at import; freeze them into a
+# plain namespace so request handlers skip the Config class lookups.
+CFG = SimpleNamespace(**{k: getattr(Config, k) for k in dir(Config) if k.isupper()})
+
 app = Flask(__name__)
 app.config.from_object(Config)
 CORS(app)
 
 # Initialize base services
 redis_service = RedisService()
-supabase_service = SupabaseService()
+supabase_service = get_supabase_service()
 external_api_service = ExternalAPIService()
 
 # Initialize 3-tier cache manager
@@ -42,55 +49,72 @@ question_service = QuestionService(
 
 adaptive_engine = AdaptiveEngine()
 
-# Initialize and start session cleanup scheduler
-cleanup_scheduler = SessionCleanupScheduler(
-    redis_service=redis_service,
-    interval_minutes=10,  # Run cleanup every 10 minutes
-    inactivity_threshold=30  # Remove sessions inactive for 30 minutes
-)
-cleanup_scheduler.start()
+# Evict this worker's L1 copies whenever any worker invalidates a pool
+redis_service.subscribe_invalidations(question_service.evict_cached_questions)
 
 logger.info("✅ Adaptive Testing System initialized with 3-tier caching")
 
+def json_body() -> dict:
+    """Parse the request body with orjson (an empty body parses to {})"""
+    raw = request.get_data(cache=False)
+    return orjson.loads(raw) if raw else {}
+
+def ojsonify(obj) -> Response:
+    """jsonify replacement backed by orjson (numpy arrays serialize natively)"""
+    return Response(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
+
+# Serialized /health body and when it was built; backends are probed at most
+# once per HEALTH_CACHE_TTL no matter how often load balancers poll
+_health_cache = (0.0, None)
+
+# The root probe carries no live data, so its body is built once
+_ROOT_HEALTH_BODY = orjson.dumps({'status': 'healthy', 'version': CFG.VERSION})
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint with 3-tier cache status"""
-    return jsonify({
-        'status': 'healthy',
-        'version': Config.VERSION,
-        'timestamp': datetime.now().isoformat(),
-        'architecture': '3-tier-cache',
-        'services': {
-            'tier1_redis': redis_service.test_connection(),
-            'tier2_supabase': supabase_service.test_connection(),
-            'tier3_external_api': external_api_service.test_connection()
-        },
-        'cache_stats': cache_manager.get_cache_stats()
-    })
+    global _health_cache
+
+    now = time.time()
+    built_at, body = _health_cache
+    if body is None or now - built_at >= CFG.HEALTH_CACHE_TTL:
+        body = orjson.dumps({
+            'status': 'healthy',
+            'version': CFG.VERSION,
+            'timestamp': datetime.now().isoformat(),
+            'architecture': '3-tier-cache',
+            'services': {
+                'tier1_redis': redis_service.test_connection(),
+                'tier2_supabase': supabase_service.test_connection(),
+                'tier3_external_api': external_api_service.test_connection()
+            },
+            'cache_stats': cache_manager.get_cache_stats()
+        })
+        _health_cache = (now, body)
+
+    return Response(body, mimetype='application/json')
+
 @app.route('/', methods=['GET'])
 def root_health_check():
     """Lightweight root availability probe."""
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
-    })
+    return Response(_ROOT_HEALTH_BODY, mimetype='application/json')
 
 @app.route('/api/questions/upload', methods=['POST'])
 def upload_questions():
     """Upload questions for testing"""
     try:
-        data = request.get_json()
+        data = json_body()
         questions = data.get('questions', [])
         
         if not questions:
-            return jsonify({'error': 'No questions provided'}), 400
+            return ojsonify({'error': 'No questions provided'}), 400
         
         # Validate and store questions
         result = question_service.store_questions(questions)
         if not result['success']:
-            return jsonify({'error': result['message']}), 400
+            return ojsonify({'error': result['message']}), 400
             
-        return jsonify({
+        return ojsonify({
             'message': 'Questions uploaded successfully',
             'count': len(questions),
             'question_pool_id': result['question_pool_id']
@@ -98,13 +122,13 @@ def upload_questions():
         
     except Exception as e:
         logger.error(f"Error uploading questions: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/test/start', methods=['POST'])
 def start_test():
     """Start a new adaptive test session (NEW ARCHITECTURE: DB + Redis hot data)"""
     try:
-        data = request.get_json()
+        data = json_body()
         student_id = data.get('student_id')
         question_pool_id = data.get('question_pool_id')
         concept_names = data.get('concept_names', ['Math', 'Algebra', 'Geometry', 'Statistics', 'Calculus'])
@@ -116,17 +140,17 @@ def start_test():
         })
 
         if not student_id:
-            return jsonify({'error': 'student_id is required'}), 400
+            return ojsonify({'error': 'student_id is required'}), 400
 
-        # Create new session
+        # Create new session. Keep the canonical hyphenated UUID: test_sessions.id is a
+        # UUID column, so a bare hex id would come back hyphenated from Supabase and
+        # no longer match the Redis session key.
         session_id = str(uuid.uuid4())
 
-        # Get questions from DATABASE (not Redis)
-        questions = question_service.get_questions(question_pool_id)
+        # Get questions and Q-matrix (cached per pool content version)
+        questions, q_matrix, pool_version = question_service.load_pool(question_pool_id)
         if not questions:
-            return jsonify({'error': 'No questions available'}), 404
-
-        q_matrix = question_service.create_q_matrix(questions)
+            return ojsonify({'error': 'No questions available'}), 404
 
         # Get or create student proficiency
         student = supabase_service.get_or_create_student(student_id, concept_names)
@@ -149,16 +173,18 @@ def start_test():
         redis_state = {
             'student_id': student_id,
             'question_pool_id': question_pool_id,
+            'pool_version': pool_version,
             'current_proficiency': initial_proficiency,
             'next_question_id': next_question['id'],
             'status': 'active',
             'questions_answered': 0,
             'correct_count': 0,
+            'responses_summary': adaptive_engine.empty_summary(),
             'end_criteria': end_criteria
         }
         redis_service.store_session_state(session_id, redis_state)
 
-        return jsonify({
+        return ojsonify({
             'session_id': session_id,
             'student_id': student_id,
             'initial_proficiency': initial_proficiency,
@@ -169,116 +195,142 @@ def start_test():
 
     except Exception as e:
         logger.error(f"Error starting test: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/test/submit', methods=['POST'])
 def submit_response():
     """Submit response and get next question (NEW ARCHITECTURE: Submission locks + minimal Redis)"""
+    locked = False
     try:
-        data = request.get_json()
+        data = json_body()
         session_id = data.get('session_id')
         question_id = data.get('question_id')
         response = data.get('response')  # 0 or 1
 
         if not all([session_id, question_id is not None, response is not None]):
-            return jsonify({'error': 'session_id, question_id, and response are required'}), 400
+            return ojsonify({'error': 'session_id, question_id, and response are required'}), 400
 
-        # PREVENT DOUBLE SUBMISSION with Redis lock
+        # PREVENT DOUBLE SUBMISSION with a single SET NX PX; successful paths drop
+        # it in their pipelined write, error paths release it so a retry isn't a 409
         if not redis_service.acquire_submission_lock(session_id, question_id):
-            return jsonify({'error': 'This question has already been submitted'}), 409
+            return ojsonify({'error': 'This question has already been submitted'}), 409
+        locked = True
 
-        try:
-            # Get session state from Redis (hot data)
-            session_state = redis_service.get_session_state(session_id)
-            if not session_state:
-                return jsonify({'error': 'Session not found or expired'}), 404
+        # Get session state from Redis (hot data)
+        session_state = redis_service.get_session_state(session_id)
+        if not session_state:
+            redis_service.release_submission_lock(session_id, question_id)
+            return ojsonify({'error': 'Session not found or expired'}), 404
 
-            if session_state['status'] != 'active':
-                return jsonify({'error': 'Session is not active'}), 400
+        if session_state['status'] != 'active':
+            redis_service.release_submission_lock(session_id, question_id)
+            return ojsonify({'error': 'Session is not active'}), 400
 
-            student_id = session_state['student_id']
-            current_proficiency = session_state['current_proficiency']
-            question_pool_id = session_state['question_pool_id']
+        student_id = session_state['student_id']
+        current_proficiency = session_state['current_proficiency']
+        question_pool_id = session_state['question_pool_id']
 
-            # Get question from database (with cache)
-            question = question_service.get_question_by_id(question_id)
-            if not question:
-                return jsonify({'error': 'Question not found'}), 404
+        # Get question from database (with cache)
+        question = question_service.get_question_by_id(question_id)
+        if not question:
+            redis_service.release_submission_lock(session_id, question_id)
+            return ojsonify({'error': 'Question not found'}), 404
 
-            # Get all questions for Q-matrix
-            questions = question_service.get_questions(question_pool_id)
-            q_matrix = question_service.create_q_matrix(questions)
+        # Reuse the pool snapshot this session started with
+        questions, q_matrix = question_service.get_pool_snapshot(
+            question_pool_id, session_state.get('pool_version')
+        )
 
-            # Update proficiency using adaptive engine
-            new_proficiency = adaptive_engine.update_ability(
-                current_proficiency, question, response, q_matrix
+        # Update proficiency using adaptive engine (item parameters from the pool arrays)
+        pool = adaptive_engine.pool_arrays(questions, q_matrix, len(current_proficiency))
+        new_proficiency = adaptive_engine.update_ability(
+            current_proficiency, question, response, q_matrix, pool
+        )
+        # Proficiency stays an ndarray in session state (orjson writes it to Redis as
+        # a list); Supabase rows and the response summary get one list conversion here
+        proficiency_before = np.asarray(current_proficiency).tolist()
+        proficiency_after = new_proficiency.tolist()
+
+        # Update counters
+        questions_answered = session_state['questions_answered'] + 1
+        correct_count = session_state['correct_count'] + (1 if response == 1 else 0)
+
+        # Running response summary (count, answered ids, recent estimates) lives in
+        # session state; sessions started before it existed rebuild it once
+        responses_summary = session_state.get('responses_summary')
+        if responses_summary is None:
+            responses_summary = adaptive_engine.summarize_responses(
+                supabase_service.get_user_responses(student_id, session_id)
             )
+        # A new summary, so a failed request leaves the one it read untouched
+        responses_summary = adaptive_engine.with_response(
+            responses_summary, question_id, response, proficiency_after
+        )
 
-            # Update counters
-            questions_answered = session_state['questions_answered'] + 1
-            correct_count = session_state['correct_count'] + (1 if response == 1 else 0)
+        # SAVE TO DATABASE (permanent record) - response, proficiency and session
+        # activity in one round-trip and one transaction
+        supabase_service.record_response(
+            student_id, session_id, question_id, response,
+            proficiency_before, proficiency_after
+        )
 
-            # SAVE TO DATABASE (permanent record)
-            supabase_service.update_user_proficiency(student_id, new_proficiency)
-            supabase_service.store_response(
-                student_id, session_id, question_id, response,
-                current_proficiency, new_proficiency
-            )
-            supabase_service.update_session_activity(session_id)
+        # Check end criteria
+        should_continue = adaptive_engine.should_continue(
+            responses_summary, new_proficiency, session_state['end_criteria']
+        )
 
-            # Build response list for end criteria check
-            responses = supabase_service.get_user_responses(student_id, session_id)
+        if should_continue:
+            # Select next question
+            next_question = adaptive_engine.select_next_question(
+                questions, q_matrix, new_proficiency, responses_summary['question_ids']
+            )
 
-            # Check end criteria
-            should_continue = adaptive_engine.should_continue(
-                responses, new_proficiency, session_state['end_criteria']
+            # UPDATE REDIS (hot data only) and release the lock in one round-trip
+            session_state['current_proficiency'] = new_proficiency
+            session_state['questions_answered'] = questions_answered
+            session_state['next_question_id'] = next_question['id']
+            session_state['correct_count'] = correct_count
+            session_state['responses_summary'] = responses_summary
+            stored = redis_service.store_session_and_release(
+                session_id, session_state, question_id,
+                changed=['current_proficiency', 'questions_answered', 'next_question_id',
+                         'correct_count', 'responses_summary']
+            )
+            locked = False
+            if not stored:
+                # Expired or cleaned up mid-request, so nothing was written back (the
+                # script dropped the lock; this DEL covers a failed Redis call)
+                redis_service.release_submission_lock(session_id, question_id)
+                return ojsonify({'error': 'Session expired'}), 404
+
+            return ojsonify({
+                'status': 'continue',
+                'current_proficiency': proficiency_after,
+                'next_question': next_question,
+                'questions_answered': questions_answered
+            })
+        else:
+            # End test - save final results to DATABASE
+            supabase_service.complete_session(
+                session_id, proficiency_after, questions_answered, correct_count
             )
 
-            if should_continue:
-                # Select next question
-                next_question = adaptive_engine.select_next_question(
-                    questions, q_matrix, new_proficiency, responses
-                )
-
-                # UPDATE REDIS (hot data only)
-                redis_service.update_session_proficiency(
-                    session_id, new_proficiency, questions_answered
-                )
-
-                # Update next question in state
-                session_state['next_question_id'] = next_question['id']
-                session_state['correct_count'] = correct_count
-                redis_service.store_session_state(session_id, session_state)
-
-                return jsonify({
-                    'status': 'continue',
-                    'current_proficiency': new_proficiency,
-                    'next_question': next_question,
-                    'questions_answered': questions_answered
-                })
-            else:
-                # End test - save final results to DATABASE
-                supabase_service.complete_session(
-                    session_id, new_proficiency, questions_answered, correct_count
-                )
-
-                # CLEANUP Redis (remove hot data)
-                redis_service.delete_session_state(session_id)
-
-                return jsonify({
-                    'status': 'completed',
-                    'final_proficiency': new_proficiency,
-                    'total_questions': questions_answered,
-                    'accuracy': correct_count / questions_answered if questions_answered > 0 else 0
-                })
-
-        finally:
-            # Always release the lock
-            redis_service.release_submission_lock(session_id, question_id)
+            # CLEANUP Redis (remove hot data) and release the lock together
+            redis_service.delete_session_and_release(session_id, question_id)
+            locked = False
+
+            return ojsonify({
+                'status': 'completed',
+                'final_proficiency': proficiency_after,
+                'total_questions': questions_answered,
+                'accuracy': correct_count / questions_answered if questions_answered > 0 else 0
+            })
 
     except Exception as e:
         logger.error(f"Error submitting response: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        if locked:
+            redis_service.release_submission_lock(session_id, question_id)
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/test/status/<session_id>', methods=['GET'])
 def get_test_status(session_id):
@@ -289,7 +341,7 @@ def get_test_status(session_id):
 
         if session_state:
             # Active session - data in Redis
-            return jsonify({
+            return ojsonify({
                 'session_id': session_id,
                 'status': session_state['status'],
                 'current_proficiency': session_state['current_proficiency'],
@@ -300,9 +352,9 @@ def get_test_status(session_id):
             # Check database for completed/expired sessions
             session_data = supabase_service.get_session(session_id)
             if not session_data:
-                return jsonify({'error': 'Session not found'}), 404
+                return ojsonify({'error': 'Session not found'}), 404
 
-            return jsonify({
+            return ojsonify({
                 'session_id': session_id,
                 'status': session_data.get('status', 'expired'),
                 'current_proficiency': session_data.get('final_proficiency', session_data.get('initial_proficiency', [])),
@@ -314,7 +366,7 @@ def get_test_status(session_id):
 
     except Exception as e:
         logger.error(f"Error getting test status: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/student/<student_id>/proficiency', methods=['GET'])
 def get_student_proficiency(student_id):
@@ -322,12 +374,12 @@ def get_student_proficiency(student_id):
     try:
         student = supabase_service.get_student(student_id)
         if not student:
-            return jsonify({'error': 'Student not found'}), 404
+            return ojsonify({'error': 'Student not found'}), 404
             
         proficiency = supabase_service.get_current_proficiency(student_id)
         concept_names = supabase_service.get_concept_names(student_id)
         
-        return jsonify({
+        return ojsonify({
             'student_id': student_id,
             'proficiency': proficiency,
             'concept_names': concept_names,
@@ -336,7 +388,22 @@ def get_student_proficiency(student_id):
         
     except Exception as e:
         logger.error(f"Error getting student proficiency: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/student/<student_id>/cache/invalidate', methods=['POST'])
+def invalidate_student_cache(student_id):
+    """Drop cached student and concept lookups after a roster change"""
+    try:
+        supabase_service.clear_student_cache(student_id)
+
+        return ojsonify({
+            'message': 'Student cache invalidated',
+            'student_id': student_id
+        })
+
+    except Exception as e:
+        logger.error(f"Error invalidating student cache: {str(e)}")
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/student/<student_id>/history', methods=['GET'])
 def get_student_history(student_id):
@@ -344,14 +411,14 @@ def get_student_history(student_id):
     try:
         history = supabase_service.get_test_history(student_id)
         
-        return jsonify({
+        return ojsonify({
             'student_id': student_id,
             'test_sessions': history
         })
         
     except Exception as e:
         logger.error(f"Error getting student history: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/student/<student_id>/progress', methods=['GET'])
 def get_student_progress(student_id):
@@ -359,14 +426,14 @@ def get_student_progress(student_id):
     try:
         progress = supabase_service.get_learning_progress(student_id)
         
-        return jsonify({
+        return ojsonify({
             'student_id': student_id,
             'progress_data': progress
         })
         
     except Exception as e:
         logger.error(f"Error getting student progress: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/test/end/<session_id>', methods=['POST'])
 def end_test(session_id):
@@ -378,7 +445,7 @@ def end_test(session_id):
         if session_state:
             # Active session in Redis
             student_id = session_state['student_id']
-            current_proficiency = session_state['current_proficiency']
+            current_proficiency = np.asarray(session_state['current_proficiency']).tolist()
             questions_answered = session_state['questions_answered']
             correct_count = session_state.get('correct_count', 0)
 
@@ -390,7 +457,7 @@ def end_test(session_id):
             # Cleanup Redis
             redis_service.delete_session_state(session_id)
 
-            return jsonify({
+            return ojsonify({
                 'status': 'ended',
                 'final_proficiency': current_proficiency,
                 'total_questions': questions_answered,
@@ -400,9 +467,9 @@ def end_test(session_id):
             # Check if already in database
             session_data = supabase_service.get_session(session_id)
             if not session_data:
-                return jsonify({'error': 'Session not found'}), 404
+                return ojsonify({'error': 'Session not found'}), 404
 
-            return jsonify({
+            return ojsonify({
                 'status': session_data.get('status', 'already_ended'),
                 'final_proficiency': session_data.get('final_proficiency', []),
                 'total_questions': session_data.get('total_questions', 0),
@@ -411,17 +478,17 @@ def end_test(session_id):
 
     except Exception as e:
         logger.error(f"Error ending test: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/sessions/cleanup', methods=['POST'])
 def cleanup_sessions():
     """Manually trigger cleanup of inactive sessions"""
     try:
-        inactivity_minutes = request.get_json().get('inactivity_minutes', 30) if request.is_json else 30
+        inactivity_minutes = json_body().get('inactivity_minutes', 30) if request.is_json else 30
 
         cleanup_count = redis_service.cleanup_inactive_sessions(inactivity_minutes)
 
-        return jsonify({
+        return ojsonify({
             'message': f'Cleanup completed',
             'sessions_removed': cleanup_count,
             'inactivity_threshold_minutes': inactivity_minutes
@@ -429,15 +496,15 @@ def cleanup_sessions():
 
     except Exception as e:
         logger.error(f"Error during cleanup: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/debug/redis/stats', methods=['GET'])
 def get_redis_stats():
-    """Get Redis statistics for monitoring"""
+    """Get Redis statistics for monitoring (?scan=1 also counts locks and cached questions)"""
     try:
-        stats = redis_service.get_stats()
+        stats = redis_service.get_stats(scan_keys=request.args.get('scan') == '1')
 
-        return jsonify({
+        return ojsonify({
             'redis_stats': stats,
             'architecture': '3-tier-cache',
             'description': 'Tier 1: Redis (hot cache), stores active session state and question pools'
@@ -445,7 +512,7 @@ def get_redis_stats():
 
     except Exception as e:
         logger.error(f"Error getting Redis stats: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 # ===== 3-TIER CACHE ENDPOINTS =====
 
@@ -463,9 +530,9 @@ def get_question_pool_cached(level, level_id):
         pool_data = question_service.get_question_pool(level, level_id, fetch_all_pages)
 
         if not pool_data:
-            return jsonify({'error': 'Question pool not found'}), 404
+            return ojsonify({'error': 'Question pool not found'}), 404
 
-        return jsonify({
+        return ojsonify({
             'pool_data': pool_data,
             'cache_tier': pool_data.get('cache_tier', 'unknown'),
             'cached_at': pool_data.get('cached_at')
@@ -473,15 +540,16 @@ def get_question_pool_cached(level, level_id):
 
     except Exception as e:
         logger.error(f"Error getting question pool: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/cache/question-pool/<level>/<level_id>/invalidate', methods=['POST'])
 def invalidate_question_pool(level, level_id):
     """Invalidate question pool from all cache tiers"""
     try:
         success = cache_manager.invalidate_question_pool(level, level_id)
+        question_service.evict_cached_questions(f"{level}_{level_id}")
 
-        return jsonify({
+        return ojsonify({
             'message': 'Question pool invalidated from all cache tiers',
             'pool_id': f"{level}_{level_id}",
             'success': success
@@ -489,18 +557,19 @@ def invalidate_question_pool(level, level_id):
 
     except Exception as e:
         logger.error(f"Error invalidating question pool: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/cache/question-pool/<level>/<level_id>/refresh', methods=['POST'])
 def refresh_question_pool(level, level_id):
     """Force refresh question pool from external API"""
     try:
+        question_service.evict_cached_questions(f"{level}_{level_id}")
         pool_data = cache_manager.refresh_question_pool(level, level_id)
 
         if not pool_data:
-            return jsonify({'error': 'Failed to refresh question pool'}), 500
+            return ojsonify({'error': 'Failed to refresh question pool'}), 500
 
-        return jsonify({
+        return ojsonify({
             'message': 'Question pool refreshed successfully',
             'pool_id': pool_data.get('pool_id'),
             'total_questions': pool_data.get('total_questions'),
@@ -509,7 +578,7 @@ def refresh_question_pool(level, level_id):
 
     except Exception as e:
         logger.error(f"Error refreshing question pool: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/cache/stats', methods=['GET'])
 def get_cache_stats():
@@ -517,7 +586,7 @@ def get_cache_stats():
     try:
         stats = cache_manager.get_cache_stats()
 
-        return jsonify({
+        return ojsonify({
             'cache_stats': stats,
             'description': {
                 'tier1': 'Redis (~1ms latency, 24h TTL)',
@@ -528,7 +597,7 @@ def get_cache_stats():
 
     except Exception as e:
         logger.error(f"Error getting cache stats: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/cache/stats/reset', methods=['POST'])
 def reset_cache_stats():
@@ -536,13 +605,13 @@ def reset_cache_stats():
     try:
         cache_manager.reset_cache_stats()
 
-        return jsonify({
+        return ojsonify({
             'message': 'Cache statistics reset successfully'
         })
 
     except Exception as e:
         logger.error(f"Error resetting cache stats: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/cache/warmup', methods=['POST'])
 def warmup_cache():
@@ -558,25 +627,25 @@ def warmup_cache():
         }
     """
     try:
-        data = request.get_json()
+        data = json_body()
         pools_data = data.get('pools', [])
 
         if not pools_data:
-            return jsonify({'error': 'No pools provided'}), 400
+            return ojsonify({'error': 'No pools provided'}), 400
 
         # Convert to list of tuples
         pools = [(p['level'], p['level_id']) for p in pools_data]
 
         results = cache_manager.warmup_cache(pools)
 
-        return jsonify({
+        return ojsonify({
             'message': 'Cache warmup completed',
             'results': results
         })
 
     except Exception as e:
         logger.error(f"Error warming up cache: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
+        return ojsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002, debug=Config.DEBUG)
+    app.run(host='0.0.0.0', port=5002, debug=CFG.DEBUG)
@@ -0,0 +1,74 @@
+# app/models/_irt_kernels.py - Numba kernels for the IRT hot path
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the deployment image
+    NUMBA_AVAILABLE = False
+    logger.warning("numba not installed, falling back to NumPy question selection")
+
+
+def _best_question_idx(Q, disc, disc2, diff, theta, used_mask):
+    """
+    Row of the most informative unused question, or -1 if every row is used
+
+    One fused pass over Q: dot product, logistic, Fisher information and the
+    running argmax, so Q is streamed once and no (N,) temporaries are built.
+    Probabilities are clipped to [0.01, 0.99] like the NumPy path; disc2 is the
+    discrimination squared, precomputed once per pool.
+    """
+    n, k = Q.shape
+    # float32 constants keep every intermediate in float32 (mixing in float64
+    # literals would promote the whole expression and halve the SIMD width)
+    zero = np.float32(0.0)
+    one = np.float32(1.0)
+    p_min = np.float32(0.01)
+    p_max = np.float32(0.99)
+
+    best_i = -1
+    best_info = np.float32(-1.0)
+    for i in range(n):
+        if used_mask[i]:
+            continue
+        s = zero
+        for j in range(k):
+            s += Q[i, j] * theta[j]
+        lin = disc[i] * s - diff[i]
+        p = one / (one + np.exp(-lin))
+        p = min(max(p, p_min), p_max)
+        info = disc2[i] * p * (one - p)
+        if info > best_info:
+            best_info = info
+            best_i = i
+    return best_i
+
+
+# Concrete signature of the only call site: C-contiguous float32 pool arrays and
+# proficiency plus a bool mask. Passing it to njit compiles eagerly at import
+# (worker boot) instead of on the first request, and cache=True lets later
+# processes load the machine code from __pycache__ (the image build primes it).
+BEST_QUESTION_SIGNATURE = 'i8(f4[:, ::1], f4[::1], f4[::1], f4[::1], f4[::1], b1[::1])'
+
+
+def _compile_best_question_idx():
+    """Eagerly compile the kernel, bypassing an unusable on-disk cache; None if numba fails"""
+    # Serial on purpose: request threads call this concurrently, and numba's default
+    # workqueue threading layer is not safe for concurrent parallel regions. Pools are
+    # small enough that the fused single pass is what matters, not extra cores.
+    try:
+        return njit(BEST_QUESTION_SIGNATURE, fastmath=True, cache=True, nogil=True)(_best_question_idx)
+    except Exception as e:
+        logger.warning(f"Cached IRT kernel unusable, recompiling: {str(e)}")
+    try:
+        return njit(BEST_QUESTION_SIGNATURE, fastmath=True, nogil=True)(_best_question_idx)
+    except Exception as e:
+        logger.error(f"Failed to compile IRT kernel, using NumPy selection: {str(e)}")
+        return None
+
+
+best_question_idx = _compile_best_question_idx() if NUMBA_AVAILABLE else None
@@ -1,78 +1,153 @@
+import math
 import numpy as np
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from cachetools import LRUCache
 from scipy.special import expit
 
+from ._irt_kernels import best_question_idx
+
 logger = logging.getLogger(__name__)
 
+# Number of most recent proficiency estimates kept for the precision criterion
+RECENT_WINDOW = 5
+
+class PoolArrays(NamedTuple):
+    """Question pool laid out as dense arrays, one row per question"""
+    Q: np.ndarray  # (N, K) concept loadings
+    disc: np.ndarray  # (N,) discrimination
+    disc2: np.ndarray  # (N,) discrimination squared, the Fisher information scale
+    diff: np.ndarray  # (N,) difficulty
+    id_to_row: Dict[str, int]
+
 class AdaptiveEngine:
-    """Adaptive testing engine using IRT and Q-matrix"""
+    """
+    Adaptive testing engine using IRT and Q-matrix
+
+    Scoring math runs in float32 (plenty for proficiencies bounded to [-3, 3]);
+    proficiencies cross the API/storage boundary as plain lists of floats.
+    """
     
     def __init__(self, learning_rate: float = 0.1):
         self.learning_rate = learning_rate
+        # Pool arrays per question list. QuestionService hands out one list object per
+        # (pool_id, pool_version) snapshot, so list identity is the pool key; entries hold
+        # the list itself so its id() cannot be recycled while cached (a bare
+        # functools.lru_cache on id() would not guarantee that)
+        self._pool_arrays = LRUCache(maxsize=64)
     
     def select_next_question(self, questions: List[Dict], q_matrix: Dict, 
-                           proficiency: List[float], responses: List[Dict]) -> Dict:
-        """Select next most informative question"""
+                           proficiency: List[float], answered_ids: Iterable[str]) -> Dict:
+        """Select next most informative question not answered yet"""
         try:
-            used_questions = {r['question_id'] for r in responses}
-            available_questions = [q for q in questions if q['id'] not in used_questions]
-            
-            if not available_questions:
+            if not questions:
                 return {}
             
-            # Calculate information for each available question
-            max_info = -1
-            best_question = available_questions[0]
-            
-            for question in available_questions:
-                info = self._calculate_information(question, proficiency, q_matrix)
-                if info > max_info:
-                    max_info = info
-                    best_question = question
-            
-            return best_question
+            # Score the whole pool in one batch, mask answered rows, take the most informative.
+            # The mask is rebuilt from the answered ids (at most max_questions of them) via
+            # id_to_row; the pool itself is never filtered or re-scanned in Python.
+            arrays = self.pool_arrays(questions, q_matrix, len(proficiency))
+            used_rows = [arrays.id_to_row[qid] for qid in answered_ids if qid in arrays.id_to_row]
+            
+            # pool_arrays guarantees the kernel's signature: C-contiguous float32, K columns
+            if best_question_idx is not None:
+                used_mask = np.zeros(len(questions), dtype=np.bool_)
+                used_mask[used_rows] = True
+                best = best_question_idx(arrays.Q, arrays.disc, arrays.disc2, arrays.diff,
+                                         np.ascontiguousarray(proficiency, dtype=np.float32), used_mask)
+                return questions[best] if best >= 0 else {}
+            
+            info = self._batch_information(arrays, proficiency)
+            info[used_rows] = -np.inf
+            best = int(np.argmax(info))
+            if info[best] == -np.inf:
+                return {}
+            return questions[best]
             
         except Exception as e:
             logger.error(f"Error selecting next question: {str(e)}")
             return questions[0] if questions else {}
     
     def update_ability(self, current_proficiency: List[float], question: Dict, 
-                      response: int, q_matrix: Dict) -> List[float]:
-        """Update proficiency estimate based on response"""
+                      response: int, q_matrix: Dict, pool: Optional[PoolArrays] = None) -> np.ndarray:
+        """
+        Update proficiency estimate based on response
+        With the pool's arrays, the item parameters are read from its row instead of rebuilt
+
+        Accepts a list or ndarray and returns a float32 ndarray; callers convert
+        to a list once, where the value is persisted.
+        """
         try:
-            proficiency = np.array(current_proficiency)
+            proficiency = np.asarray(current_proficiency, dtype=np.float32)
             question_id = question['id']
             
-            # Get Q-matrix row for this question
-            q_vector = np.array(q_matrix.get(question_id, [1] * len(proficiency)))
+            row = pool.id_to_row.get(question_id) if pool is not None else None
+            if row is not None and pool.Q.shape[1] == len(proficiency):
+                q_vector, discrimination, difficulty = pool.Q[row], pool.disc[row], pool.diff[row]
+            else:
+                # Get Q-matrix row for this question
+                q_vector = np.asarray(q_matrix.get(question_id, [1] * len(proficiency)), dtype=np.float32)
+                discrimination = question.get('discrimination', 1.0)
+                difficulty = question.get('difficulty', 0.0)
             
             # Calculate current probability
-            prob = self._calculate_probability(proficiency, question, q_matrix)
+            prob = self._probability(proficiency, q_vector, discrimination, difficulty)
             
             # Calculate error
             error = response - prob
             
-            # Update proficiency using gradient ascent
-            discrimination = question.get('discrimination', 1.0)
-            gradient = error * prob * (1 - prob) * discrimination * q_vector
+            # Update proficiency using gradient ascent: the scalar part of the step is
+            # folded first, so the K-vector math is one multiply into a fresh array
+            # followed by in-place add and clamp (no gradient/step temporaries)
+            step = float(self.learning_rate * error * prob * (1 - prob) * discrimination)
+            new_proficiency = np.multiply(q_vector, step, dtype=np.float32)
+            new_proficiency += proficiency
             
-            new_proficiency = proficiency + self.learning_rate * gradient
+            # Keep proficiency in reasonable bounds (in place, no extra allocation)
+            np.minimum(np.maximum(new_proficiency, -3.0, out=new_proficiency), 3.0, out=new_proficiency)
             
-            # Keep proficiency in reasonable bounds
-            new_proficiency = np.clip(new_proficiency, -3.0, 3.0)
-            
-            return new_proficiency.tolist()
+            return new_proficiency
             
         except Exception as e:
             logger.error(f"Error updating proficiency: {str(e)}")
-            return current_proficiency
+            return np.asarray(current_proficiency, dtype=np.float32)
+    
+    @staticmethod
+    def empty_summary() -> Dict:
+        """Running summary of a session's responses, kept in session state"""
+        return {'n': 0, 'n_correct': 0, 'question_ids': [], 'recent_proficiencies': []}
+    
+    @staticmethod
+    def record_response(summary: Dict, question_id: str, response: int,
+                        proficiency_after: List[float]) -> Dict:
+        """Fold one response into a running summary (in place)"""
+        summary['n'] += 1
+        summary['n_correct'] += 1 if response == 1 else 0
+        summary['question_ids'].append(question_id)
+        summary['recent_proficiencies'] = (summary['recent_proficiencies'] + [proficiency_after])[-RECENT_WINDOW:]
+        return summary
+    
+    @classmethod
+    def with_response(cls, summary: Dict, question_id: str, response: int,
+                      proficiency_after: List[float]) -> Dict:
+        """Like record_response, but returns a new summary and leaves `summary` as it was"""
+        copied = dict(summary, question_ids=list(summary['question_ids']),
+                      recent_proficiencies=list(summary['recent_proficiencies']))
+        return cls.record_response(copied, question_id, response, proficiency_after)
+
+    @classmethod
+    def summarize_responses(cls, responses: List[Dict]) -> Dict:
+        """Build a running summary from a full response history"""
+        summary = cls.empty_summary()
+        for r in responses:
+            cls.record_response(summary, r['question_id'], r['response'], r['proficiency_after'])
+        return summary
     
-    def should_continue(self, responses: List[Dict], proficiency: List[float], 
+    def should_continue(self, responses_summary: Dict, proficiency: List[float], 
                        end_criteria: Dict) -> bool:
-        """Determine if test should continue based on end criteria"""
+        """Determine if test should continue based on end criteria and the response summary"""
         try:
-            num_responses = len(responses)
+            num_responses = responses_summary['n']
             criteria_type = end_criteria.get('type', 'fixed_length')
             
             # Check minimum questions
@@ -91,7 +166,7 @@ class AdaptiveEngine:
             elif criteria_type == 'precision':
                 # Stop when precision threshold is reached
                 precision_threshold = end_criteria.get('precision_threshold', 0.3)
-                current_precision = self._estimate_precision(responses, proficiency)
+                current_precision = self._estimate_precision(responses_summary, proficiency)
                 return current_precision > precision_threshold
             
             elif criteria_type == 'classification':
@@ -114,11 +189,14 @@ class AdaptiveEngine:
             initial_proficiency = session_data.get('initial_proficiency', [])
             
             total_questions = len(responses)
-            correct_responses = sum(1 for r in responses if r['response'] == 1)
+            correct_responses = int(np.count_nonzero(
+                np.fromiter((r['response'] for r in responses), dtype=np.int8, count=total_questions) == 1
+            ))
             accuracy = correct_responses / total_questions if total_questions > 0 else 0
             
             # Calculate proficiency change
-            proficiency_change = np.array(final_proficiency) - np.array(initial_proficiency)
+            proficiency_change = (np.asarray(final_proficiency, dtype=np.float32)
+                                  - np.asarray(initial_proficiency, dtype=np.float32))
             learning_gain = float(np.mean(np.abs(proficiency_change)))
             
             return {
@@ -136,63 +214,83 @@ class AdaptiveEngine:
             logger.error(f"Error generating summary: {str(e)}")
             return {'error': 'Failed to generate summary'}
     
-    def _calculate_information(self, question: Dict, proficiency: List[float], 
-                             q_matrix: Dict) -> float:
-        """Calculate Fisher information for question"""
-        try:
-            prob = self._calculate_probability(proficiency, question, q_matrix)
-            discrimination = question.get('discrimination', 1.0)
-            
-            # Fisher information
-            info = discrimination ** 2 * prob * (1 - prob)
-            
-            return info
-            
-        except Exception:
-            return 0.0
+    def pool_arrays(self, questions: List[Dict], q_matrix: Dict, num_concepts: int) -> PoolArrays:
+        """
+        Dense arrays for a question pool, built once per pool list and reused
+        Raises ValueError if a Q-matrix row does not have num_concepts entries, so the
+        scoring code downstream can rely on the shapes without guarding every call
+        """
+        cached = self._pool_arrays.get(id(questions))
+        if cached is not None:
+            cached_questions, cached_q_matrix, arrays = cached
+            if cached_questions is questions and cached_q_matrix is q_matrix and arrays.Q.shape[1] == num_concepts:
+                return arrays
+        
+        default_vector = [1] * num_concepts
+        rows = [q_matrix.get(question['id'], default_vector) for question in questions]
+        bad = next((question['id'] for question, row in zip(questions, rows) if len(row) != num_concepts), None)
+        if bad is not None:
+            raise ValueError(f"Q-matrix row for question {bad} does not have {num_concepts} concepts")
+        
+        disc = np.fromiter((question.get('discrimination', 1.0) for question in questions),
+                           dtype=np.float32, count=len(questions))
+        arrays = PoolArrays(
+            Q=np.asarray(rows, dtype=np.float32).reshape(len(questions), num_concepts),
+            disc=disc,
+            disc2=disc * disc,
+            diff=np.fromiter((question.get('difficulty', 0.0) for question in questions),
+                             dtype=np.float32, count=len(questions)),
+            id_to_row={question['id']: row for row, question in enumerate(questions)}
+        )
+        self._pool_arrays[id(questions)] = (questions, q_matrix, arrays)
+        return arrays
+    
+    def _batch_information(self, arrays: PoolArrays, proficiency: List[float]) -> np.ndarray:
+        """Fisher information of every question in the pool at once"""
+        theta = np.asarray(proficiency, dtype=np.float32)
+        # One expit over the whole vector, clipped in place
+        prob = expit(arrays.disc * (arrays.Q @ theta) - arrays.diff)
+        np.clip(prob, 0.01, 0.99, out=prob)
+        return arrays.disc2 * prob * (1 - prob)
     
     def _calculate_probability(self, proficiency: List[float], question: Dict, 
                              q_matrix: Dict) -> float:
-        """Calculate probability of correct response using multidimensional IRT"""
-        try:
-            proficiency_array = np.array(proficiency)
-            question_id = question['id']
-            
-            # Get Q-matrix row
-            q_vector = np.array(q_matrix.get(question_id, [1] * len(proficiency)))
-            
-            # Calculate linear combination
-            discrimination = question.get('discrimination', 1.0)
-            difficulty = question.get('difficulty', 0.0)
-            
-            linear_term = discrimination * np.dot(q_vector, proficiency_array) - difficulty
-            
-            # Apply logistic function
-            prob = expit(linear_term)
-            
-            return float(np.clip(prob, 0.01, 0.99))
-            
-        except Exception:
-            return 0.5
+        """
+        Calculate probability of correct response using multidimensional IRT
+        Item parameters are numeric by the time a pool gets here (see transform_to_internal_format)
+        """
+        proficiency_array = np.asarray(proficiency, dtype=np.float32)
+        
+        # Get Q-matrix row
+        q_vector = np.asarray(q_matrix.get(question['id'], [1] * len(proficiency)), dtype=np.float32)
+        
+        return self._probability(proficiency_array, q_vector,
+                                 question.get('discrimination', 1.0),
+                                 question.get('difficulty', 0.0))
+    
+    @staticmethod
+    def _probability(proficiency: np.ndarray, q_vector: np.ndarray,
+                     discrimination: float, difficulty: float) -> float:
+        """Clipped IRT probability for one item given its parameters"""
+        linear_term = float(discrimination * np.dot(q_vector, proficiency) - difficulty)
+        # Scalar logistic in plain Python floats; a ufunc call per item costs more than the math.
+        # The exponent is bounded so math.exp cannot overflow on extreme item parameters.
+        prob = 1.0 / (1.0 + math.exp(-min(max(linear_term, -50.0), 50.0)))
+        return min(max(prob, 0.01), 0.99)
     
-    def _estimate_precision(self, responses: List[Dict], proficiency: List[float]) -> float:
+    def _estimate_precision(self, responses_summary: Dict, proficiency: List[float]) -> float:
         """Estimate current precision of proficiency estimate"""
-        if len(responses) < 2:
+        if responses_summary['n'] < 2:
             return 1.0  # Low precision with few responses
         
         # Simple precision estimate based on recent stability
-        recent_proficiencies = [r['proficiency_after'] for r in responses[-5:]]
+        recent_proficiencies = responses_summary['recent_proficiencies'][-RECENT_WINDOW:]
         if len(recent_proficiencies) < 2:
             return 1.0
         
-        # Calculate variance in recent proficiency estimates
-        variances = []
-        for i in range(len(proficiency)):
-            concept_proficiencies = [p[i] for p in recent_proficiencies]
-            if len(concept_proficiencies) > 1:
-                variances.append(np.var(concept_proficiencies))
-        
-        avg_variance = np.mean(variances) if variances else 1.0
+        # Calculate variance in recent proficiency estimates: (T, K) stack, per-concept variance
+        recent = np.asarray(recent_proficiencies, dtype=np.float32)[:, :len(proficiency)]
+        avg_variance = float(recent.var(axis=0).mean()) if recent.size else 1.0
         precision = 1.0 / (1.0 + avg_variance)
         
         return precision
@@ -214,16 +312,15 @@ class AdaptiveEngine:
         # Simple efficiency: information gained per question
         total_questions = len(responses)
         
-        # Estimate total information (simplified)
-        proficiency_changes = []
-        for response in responses:
-            before = response.get('proficiency_before', [])
-            after = response.get('proficiency_after', [])
-            if before and after:
-                change = np.linalg.norm(np.array(after) - np.array(before))
-                proficiency_changes.append(change)
-        
-        avg_change = np.mean(proficiency_changes) if proficiency_changes else 0.0
+        # Estimate total information (simplified): mean norm of the per-response change,
+        # over responses that recorded both estimates, as one (N, K) computation
+        recorded = [r for r in responses if r.get('proficiency_before') and r.get('proficiency_after')]
+        if recorded:
+            before = np.asarray([r['proficiency_before'] for r in recorded], dtype=np.float32)
+            after = np.asarray([r['proficiency_after'] for r in recorded], dtype=np.float32)
+            avg_change = float(np.linalg.norm(after - before, axis=1).mean())
+        else:
+            avg_change = 0.0
         efficiency = avg_change / total_questions if total_questions > 0 else 0.0
         
         return float(efficiency)
@@ -1,8 +1,12 @@
 # app/services/cache_manager.py - 3-Tier Cache Manager
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Optional
 from datetime import datetime
 
+from config import Config
+
 logger = logging.getLogger(__name__)
 
 class CacheManager:
@@ -17,6 +21,7 @@ class CacheManager:
     - READ: Try Tier 1 → Tier 2 → Tier 3 (waterfall)
     - WRITE: Write to all tiers on cache miss
     - INVALIDATE: Clear all tiers
+    - COALESCE: Concurrent Tier 1 misses for the same pool share one lower-tier fetch
     """
 
     def __init__(self, redis_service, supabase_service, external_api_service):
@@ -24,7 +29,8 @@ class CacheManager:
         self.supabase = supabase_service
         self.external_api = external_api_service
 
-        # Cache statistics
+        # Cache statistics (updated from request and warmup threads, so under a lock)
+        self._stats_lock = threading.Lock()
         self.stats = {
             'redis_hits': 0,
             'redis_misses': 0,
@@ -34,6 +40,10 @@ class CacheManager:
             'total_requests': 0
         }
 
+        # In-flight lower-tier fetches keyed by pool_id (request coalescing)
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
         logger.info("3-Tier Cache Manager initialized")
 
     def get_question_pool(self, level: str, level_id: str,
@@ -49,7 +59,7 @@ class CacheManager:
         Returns:
             Question pool data or None if not found
         """
-        self.stats['total_requests'] += 1
+        self._count('total_requests')
         pool_id = f"{level}_{level_id}"
 
         logger.info(f"🔍 Fetching question pool: {pool_id}")
@@ -58,19 +68,52 @@ class CacheManager:
         try:
             redis_data = self.redis.get_cached_question_pool(pool_id)
             if redis_data:
-                self.stats['redis_hits'] += 1
+                self._count('redis_hits')
                 logger.info(f"✅ TIER 1 HIT (Redis): {pool_id} - Latency: ~1ms")
                 return redis_data
             else:
-                self.stats['redis_misses'] += 1
+                self._count('redis_misses')
         except Exception as e:
             logger.warning(f"Redis error (continuing to Tier 2): {str(e)}")
 
+        return self._coalesced(
+            pool_id, lambda: self._fetch_from_lower_tiers(level, level_id, pool_id, fetch_all_pages)
+        )
+
+    def _coalesced(self, pool_id: str, fetch) -> Optional[Dict]:
+        """Run `fetch` for a pool unless one is already in flight; concurrent callers share its result"""
+        # Only one request per pool goes to the lower tiers; the rest wait for it
+        with self._inflight_lock:
+            future = self._inflight.get(pool_id)
+            is_leader = future is None
+            if is_leader:
+                future = self._inflight[pool_id] = Future()
+
+        if not is_leader:
+            logger.info(f"⏳ Waiting for in-flight fetch of {pool_id}")
+            try:
+                return future.result(timeout=Config.EXTERNAL_API_TIMEOUT * 2)
+            except Exception as e:
+                logger.error(f"In-flight fetch of {pool_id} failed: {str(e)}")
+                return None
+
+        pool_data = None
+        try:
+            pool_data = fetch()
+            return pool_data
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(pool_id, None)
+            future.set_result(pool_data)
+
+    def _fetch_from_lower_tiers(self, level: str, level_id: str, pool_id: str,
+                                fetch_all_pages: bool) -> Optional[Dict]:
+        """Tier 2 → Tier 3 part of the waterfall, writing through on the way back"""
         # === TIER 2: Try Supabase (medium) ===
         try:
             supabase_data = self.supabase.get_cached_question_pool(pool_id)
             if supabase_data:
-                self.stats['supabase_hits'] += 1
+                self._count('supabase_hits')
                 logger.info(f"✅ TIER 2 HIT (Supabase): {pool_id} - Latency: ~50ms")
 
                 # Cache in Tier 1 (write-through)
@@ -78,13 +121,18 @@ class CacheManager:
 
                 return supabase_data
             else:
-                self.stats['supabase_misses'] += 1
+                self._count('supabase_misses')
         except Exception as e:
             logger.warning(f"Supabase error (continuing to Tier 3): {str(e)}")
 
+        return self._fetch_from_external(level, level_id, pool_id, fetch_all_pages)
+
+    def _fetch_from_external(self, level: str, level_id: str, pool_id: str,
+                             fetch_all_pages: bool) -> Optional[Dict]:
+        """Tier 3 of the waterfall, writing the result through to every tier"""
         # === TIER 3: Fetch from External API (slowest, source of truth) ===
         try:
-            self.stats['external_api_calls'] += 1
+            self._count('external_api_calls')
             logger.info(f"⏳ TIER 3: Fetching from External API - Latency: ~500ms")
 
             if fetch_all_pages:
@@ -144,6 +192,9 @@ class CacheManager:
             logger.error(f"Failed to invalidate from Supabase: {str(e)}")
             success = False
 
+        # Drop process-local copies in every worker
+        self.redis.publish_invalidation(pool_id)
+
         return success
 
     def refresh_question_pool(self, level: str, level_id: str) -> Optional[Dict]:
@@ -161,38 +212,46 @@ class CacheManager:
         # Then fetch fresh data from External API
         return self.get_question_pool(level, level_id)
 
+    def _count(self, name: str, n: int = 1):
+        """Add to a cache statistic; `+=` on a shared dict loses updates across threads"""
+        with self._stats_lock:
+            self.stats[name] += n
+
     def get_cache_stats(self) -> Dict:
         """Get cache performance statistics"""
-        total = self.stats['total_requests']
+        with self._stats_lock:
+            stats = dict(self.stats)
+        total = stats['total_requests']
 
         if total == 0:
             return {
-                **self.stats,
+                **stats,
                 'redis_hit_rate': 0.0,
                 'supabase_hit_rate': 0.0,
                 'external_api_rate': 0.0
             }
 
         return {
-            **self.stats,
-            'redis_hit_rate': round(self.stats['redis_hits'] / total * 100, 2),
-            'supabase_hit_rate': round(self.stats['supabase_hits'] / total * 100, 2),
-            'external_api_rate': round(self.stats['external_api_calls'] / total * 100, 2),
+            **stats,
+            'redis_hit_rate': round(stats['redis_hits'] / total * 100, 2),
+            'supabase_hit_rate': round(stats['supabase_hits'] / total * 100, 2),
+            'external_api_rate': round(stats['external_api_calls'] / total * 100, 2),
             'overall_cache_hit_rate': round(
-                (self.stats['redis_hits'] + self.stats['supabase_hits']) / total * 100, 2
+                (stats['redis_hits'] + stats['supabase_hits']) / total * 100, 2
             )
         }
 
     def reset_cache_stats(self):
         """Reset cache statistics"""
-        self.stats = {
-            'redis_hits': 0,
-            'redis_misses': 0,
-            'supabase_hits': 0,
-            'supabase_misses': 0,
-            'external_api_calls': 0,
-            'total_requests': 0
-        }
+        with self._stats_lock:
+            self.stats = {
+                'redis_hits': 0,
+                'redis_misses': 0,
+                'supabase_hits': 0,
+                'supabase_misses': 0,
+                'external_api_calls': 0,
+                'total_requests': 0
+            }
         logger.info("Cache statistics reset")
 
     # === PRIVATE HELPER METHODS ===
@@ -252,30 +311,83 @@ class CacheManager:
             'details': []
         }
 
-        for level, level_id in pools:
-            try:
-                pool_data = self.get_question_pool(level, level_id)
+        if not pools:
+            return results
+
+        pool_ids = [f"{level}_{level_id}" for level, level_id in pools]
+        unique_ids = list(dict.fromkeys(pool_ids))
+        self._count('total_requests', len(pools))
+        found: Dict[str, Dict] = {}
+
+        # === TIER 1: one MGET for every pool ===
+        try:
+            for pool_id, pool_data in self.redis.get_cached_question_pools(unique_ids).items():
                 if pool_data:
-                    results['success'] += 1
-                    results['details'].append({
-                        'pool_id': f"{level}_{level_id}",
-                        'status': 'success',
-                        'questions': pool_data['total_questions']
-                    })
-                else:
+                    found[pool_id] = pool_data
+        except Exception as e:
+            logger.warning(f"Redis error during warmup (continuing to Tier 2): {str(e)}")
+        self._count('redis_hits', len(found))
+        self._count('redis_misses', len(unique_ids) - len(found))
+
+        # === TIER 2: batched Supabase lookup for the Tier 1 misses ===
+        missing = [pool_id for pool_id in unique_ids if pool_id not in found]
+        if missing:
+            try:
+                tier2 = self.supabase.get_cached_question_pools(missing)
+            except Exception as e:
+                logger.warning(f"Supabase error during warmup (continuing to Tier 3): {str(e)}")
+                tier2 = {}
+            for pool_id, pool_data in tier2.items():
+                found[pool_id] = pool_data
+                self._cache_to_redis(pool_id, pool_data)
+            self._count('supabase_hits', len(tier2))
+            self._count('supabase_misses', len(missing) - len(tier2))
+
+        # === TIER 3: remaining pools are independent and I/O bound, so fetch them in parallel ===
+        futures = {}
+        remaining = [(pool_id, level, level_id) for pool_id, (level, level_id) in zip(pool_ids, pools)
+                     if pool_id not in found]
+        executor = None
+        if remaining:
+            executor = ThreadPoolExecutor(max_workers=min(Config.WARMUP_CONCURRENCY, len(remaining)),
+                                          thread_name_prefix='cache-warmup')
+            for pool_id, level, level_id in remaining:
+                if pool_id not in futures:
+                    futures[pool_id] = executor.submit(
+                        self._coalesced, pool_id,
+                        lambda level=level, level_id=level_id, pool_id=pool_id:
+                            self._fetch_from_external(level, level_id, pool_id, True)
+                    )
+
+        # Results are reported in the order the pools were given
+        try:
+            for pool_id in pool_ids:
+                try:
+                    pool_data = found[pool_id] if pool_id in found else futures[pool_id].result()
+                    if pool_data:
+                        results['success'] += 1
+                        results['details'].append({
+                            'pool_id': pool_id,
+                            'status': 'success',
+                            'questions': pool_data['total_questions']
+                        })
+                    else:
+                        results['failed'] += 1
+                        results['details'].append({
+                            'pool_id': pool_id,
+                            'status': 'failed',
+                            'error': 'No data returned'
+                        })
+                except Exception as e:
                     results['failed'] += 1
                     results['details'].append({
-                        'pool_id': f"{level}_{level_id}",
-                        'status': 'failed',
-                        'error': 'No data returned'
+                        'pool_id': pool_id,
+                        'status': 'error',
+                        'error': str(e)
                     })
-            except Exception as e:
-                results['failed'] += 1
-                results['details'].append({
-                    'pool_id': f"{level}_{level_id}",
-                    'status': 'error',
-                    'error': str(e)
-                })
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
 
         logger.info(f"✅ Cache warmup complete: {results['success']} success, {results['failed']} failed")
         return results
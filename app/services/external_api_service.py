@@ -1,6 +1,10 @@
 # app/services/external_api_service.py - External API Service (Tier 3)
+import orjson
 import requests
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from datetime import datetime
 
@@ -15,22 +19,40 @@ class ExternalAPIService:
         self.base_url = Config.EXTERNAL_API_URL
         self.api_key = Config.EXTERNAL_API_KEY
         self.timeout = Config.EXTERNAL_API_TIMEOUT
+
+        # One keep-alive session for every call: connections (and TLS sessions) are
+        # reused across pages and concurrent fetches; idempotent GETs retry on 502-504
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        })
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=max(32, Config.EXTERNAL_API_PAGE_WORKERS),
+            max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                              allowed_methods=['GET'], raise_on_status=False)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Pages after the first are independent, so they are fetched concurrently
+        self.page_executor = ThreadPoolExecutor(
+            max_workers=Config.EXTERNAL_API_PAGE_WORKERS, thread_name_prefix='external-api-page'
+        )
         logger.info("External API service initialized")
 
     def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
         """Make HTTP request to external API with error handling"""
         try:
             url = f"{self.base_url}{endpoint}"
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
 
             logger.info(f"Fetching from external API: {endpoint}")
-            response = requests.get(url, headers=headers, params=params, timeout=self.timeout)
+            response = self.session.get(url, params=params, timeout=self.timeout)
 
             if response.status_code == 200:
-                return response.json()
+                # Whole-body parse is fine: pool endpoints are paged (page_size questions
+                # per response), so a body never holds more than one page
+                return orjson.loads(response.content)
             elif response.status_code == 404:
                 logger.warning(f"Resource not found: {endpoint}")
                 return None
@@ -101,18 +123,27 @@ class ExternalAPIService:
         if not pagination.get('has_more', False):
             return first_page
 
-        # Fetch remaining pages
+        # Fetch remaining pages concurrently, then merge them in page order
         all_questions = first_page['questions']
         total_pages = pagination.get('total_pages', 1)
 
-        for page in range(2, total_pages + 1):
-            logger.info(f"Fetching page {page}/{total_pages} for {level}/{level_id}")
-            page_data = self.fetch_question_pool(level, level_id, page=page, page_size=page_size)
+        logger.info(f"Fetching pages 2-{total_pages} for {level}/{level_id}")
+        pages = {
+            page: self.page_executor.submit(
+                self.fetch_question_pool, level, level_id, page=page, page_size=page_size
+            )
+            for page in range(2, total_pages + 1)
+        }
+
+        for page, future in pages.items():
+            page_data = future.result()
 
             if page_data:
                 all_questions.extend(page_data['questions'])
             else:
                 logger.warning(f"Failed to fetch page {page}, returning partial data")
+                for pending in pages.values():
+                    pending.cancel()
                 break
 
         # Update first page with all questions
@@ -145,7 +176,8 @@ class ExternalAPIService:
         # Generate pool ID from level and level_id
         pool_id = f"{external_data['level']}_{external_data['level_id']}"
 
-        # Transform questions to internal format
+        # Transform questions to internal format; item parameters are coerced to numbers
+        # here so the scoring code never has to guard against malformed values
         internal_questions = []
         for q in external_data.get('questions', []):
             internal_questions.append({
@@ -153,10 +185,10 @@ class ExternalAPIService:
                 'content': q['content'],
                 'options': q.get('options', []),
                 'correct_answer': q['correct_answer'],
-                'difficulty': q.get('difficulty', 0.5),
-                'discrimination': q.get('discrimination', 1.0),
-                'guessing': q.get('guessing', 0.25),
-                'concepts': q.get('q_vector', [1, 0, 0, 0, 0]),  # Map q_vector to concepts
+                'difficulty': self._as_float(q.get('difficulty'), 0.5),
+                'discrimination': self._as_float(q.get('discrimination'), 1.0),
+                'guessing': self._as_float(q.get('guessing'), 0.25),
+                'concepts': self._as_q_vector(q.get('q_vector')),  # Map q_vector to concepts
                 'topic_id': q.get('topic_id'),
                 'chapter_id': q.get('chapter_id'),
                 'subject_id': q.get('subject_id'),
@@ -182,15 +214,34 @@ class ExternalAPIService:
             }
         }
 
+    @staticmethod
+    def _as_float(value, default: float) -> float:
+        """Numeric item parameter, or the default when missing or malformed"""
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid item parameter {value!r}, using {default}")
+            return default
+
+    @staticmethod
+    def _as_q_vector(value) -> List[float]:
+        """Numeric q-vector, or the default single-concept vector when missing or malformed"""
+        if isinstance(value, list) and value:
+            if all(isinstance(v, (int, float)) for v in value):
+                return value
+            try:
+                return [float(v) for v in value]
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid q_vector {value!r}, using default")
+        return [1, 0, 0, 0, 0]
+
     def test_connection(self) -> bool:
         """Test connection to external API"""
         try:
             # Make a simple health check request
-            response = requests.get(
-                f"{self.base_url}/health",
-                headers={'Authorization': f'Bearer {self.api_key}'},
-                timeout=5
-            )
+            response = self.session.get(f"{self.base_url}/health", timeout=5)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"External API connection test failed: {str(e)}")
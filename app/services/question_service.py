@@ -1,9 +1,47 @@
 import uuid
+import hashlib
 import logging
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+from cachetools import LRUCache, TTLCache
+
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Read-only: mapping proxies over tuples, so no caller can change the defaults
+# for later requests. _get_default_questions hands out plain copies (orjson
+# cannot serialize mapping proxies, and callers may add keys to their copy).
+_DEFAULT_QUESTIONS: Tuple[Mapping, ...] = tuple(MappingProxyType(question) for question in (
+    {
+        "id": "q1",
+        "content": "What is 15 + 27?",
+        "options": ("40", "42", "44", "46"),
+        "correct_answer": "42",
+        "concepts": (1, 0, 0, 0, 0),
+        "difficulty": 0.3,
+        "discrimination": 1.2
+    },
+    {
+        "id": "q2",
+        "content": "Solve for x: 2x + 5 = 15",
+        "options": ("3", "5", "7", "10"),
+        "correct_answer": "5",
+        "concepts": (1, 1, 0, 0, 0),
+        "difficulty": 0.6,
+        "discrimination": 1.5
+    },
+    {
+        "id": "q3",
+        "content": "What is the derivative of x²?",
+        "options": ("x", "2x", "x²", "2x²"),
+        "correct_answer": "2x",
+        "concepts": (1, 1, 1, 0, 0),
+        "difficulty": 0.8,
+        "discrimination": 1.8
+    }
+))
+
 class QuestionService:
     """Service for managing questions and Q-matrix with 3-tier caching"""
 
@@ -20,6 +58,13 @@ class QuestionService:
         self.supabase = supabase_service
         self.redis = redis_service
 
+        # L1: per-worker (questions, pool_version) keyed by pool_id, so repeat
+        # submits within a worker skip the Redis/Supabase round-trip.
+        self._pool_l1 = TTLCache(maxsize=Config.L1_POOL_MAXSIZE, ttl=Config.L1_POOL_TTL)
+        # (questions, q_matrix) keyed by (pool_id, pool_version); sessions carry
+        # their pool_version so submits can reuse the snapshot they started with
+        self._pool_snapshots = LRUCache(maxsize=128)
+
         if cache_manager:
             logger.info("QuestionService initialized with 3-tier cache manager")
         else:
@@ -101,6 +146,64 @@ class QuestionService:
         return self.cache_manager.get_question_pool(level, level_id, fetch_all_pages)
 
     def get_questions(self, pool_id: Optional[str] = None) -> List[Dict]:
+        """Get questions for a pool (L1 first, then the cache tiers / database)"""
+        if pool_id:
+            cached = self._pool_l1.get(pool_id)
+            if cached is not None:
+                return cached[0]
+
+        questions = self._load_questions(pool_id)
+        if pool_id and questions:
+            self._pool_l1[pool_id] = (questions, self.pool_version(questions))
+        return questions
+
+    def evict_cached_questions(self, pool_id: str) -> None:
+        """Drop a pool (its snapshots, its questions and its Tier 2 memo) from this worker's L1 caches"""
+        if self.supabase:
+            self.supabase.evict_cached_pool(pool_id)
+        cached = self._pool_l1.pop(pool_id, None)
+        if cached is not None and self.redis:
+            self.redis.evict_cached_questions([question['id'] for question in cached[0]])
+        for key in [k for k in self._pool_snapshots if k[0] == pool_id]:
+            self._pool_snapshots.pop(key, None)
+
+    def load_pool(self, pool_id: Optional[str]) -> Tuple[List[Dict], Dict[str, List[int]], str]:
+        """
+        Get questions, Q-matrix and pool_version for a pool
+        The Q-matrix is only rebuilt when the pool content changes
+        """
+        questions = self.get_questions(pool_id)
+
+        cached = self._pool_l1.get(pool_id) if pool_id else None
+        if cached is not None and cached[0] is questions:
+            version = cached[1]
+        else:
+            version = self.pool_version(questions)
+
+        key = (pool_id, version)
+        snapshot = self._pool_snapshots.get(key)
+        if snapshot is None:
+            snapshot = (questions, self.create_q_matrix(questions))
+            self._pool_snapshots[key] = snapshot
+        return snapshot[0], snapshot[1], version
+
+    def get_pool_snapshot(self, pool_id: Optional[str],
+                          pool_version: Optional[str]) -> Tuple[List[Dict], Dict[str, List[int]]]:
+        """Get the questions and Q-matrix a session started with, without re-fetching the pool"""
+        snapshot = self._pool_snapshots.get((pool_id, pool_version)) if pool_version else None
+        if snapshot is None:
+            # Worker restarted or pool evicted since the session started: rebuild lazily
+            questions, q_matrix, _ = self.load_pool(pool_id)
+            return questions, q_matrix
+        return snapshot
+
+    @staticmethod
+    def pool_version(questions: List[Dict]) -> str:
+        """Short content hash of a pool's question ids and concept vectors"""
+        fingerprint = repr([(q['id'], q.get('concepts')) for q in questions])
+        return hashlib.blake2b(fingerprint.encode(), digest_size=8).hexdigest()
+
+    def _load_questions(self, pool_id: Optional[str] = None) -> List[Dict]:
         """Get questions from database (legacy method for backwards compatibility)"""
         try:
             if pool_id:
@@ -117,8 +220,7 @@ class QuestionService:
 
                     # Optionally cache in Redis for faster access
                     if self.redis and questions:
-                        for question in questions:
-                            self.redis.cache_question(question['id'], question)
+                        self.redis.cache_questions_bulk(questions)
 
                     return questions
             else:
@@ -151,35 +253,59 @@ class QuestionService:
             logger.error(f"Error getting question {question_id}: {str(e)}")
             return None
     
+    def get_questions_by_ids(self, question_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Get several questions by ID in order (None where not found)
+        One Redis MGET plus one Supabase query for the misses, whatever the count
+        """
+        try:
+            found = self.redis.get_cached_questions(question_ids) if self.redis else {}
+            missing = [question_id for question_id in question_ids if not found.get(question_id)]
+
+            if missing and self.supabase:
+                fetched = self.supabase.get_questions_by_ids(missing)
+                if self.redis and fetched:
+                    self.redis.cache_questions_bulk(list(fetched.values()))
+                found.update(fetched)
+
+            return [found.get(question_id) for question_id in question_ids]
+
+        except Exception as e:
+            logger.error(f"Error getting {len(question_ids)} questions: {str(e)}")
+            return [None] * len(question_ids)
+    
     def create_q_matrix(self, questions: List[Dict]) -> Dict[str, List[int]]:
-        """Create Q-matrix from questions"""
-        q_matrix = {}
-        for question in questions:
-            q_matrix[question['id']] = question.get('concepts', [1, 0, 0, 0, 0])
-        return q_matrix
+        """
+        Create Q-matrix from questions (question id -> concept vector)
+        The dense (n_questions, n_concepts) array the IRT math runs on is built
+        from this once per pool snapshot by AdaptiveEngine.pool_arrays
+        """
+        return {question['id']: question.get('concepts', [1, 0, 0, 0, 0]) for question in questions}
     
     def _validate_questions(self, questions: List[Dict]) -> Dict:
         """Validate question format"""
-        required_fields = ['id', 'content', 'options', 'correct_answer']
+        required_fields = ('id', 'content', 'options', 'correct_answer')
+        required = frozenset(required_fields)
         
         for i, question in enumerate(questions):
-            # Check required fields
-            for field in required_fields:
-                if field not in question:
-                    return {
-                        'valid': False,
-                        'error': f'Question {i+1} missing required field: {field}'
-                    }
+            # Check required fields: one C-level keys-view comparison, only
+            # working out which field is missing for the question that fails
+            if not question.keys() >= required:
+                missing = next(field for field in required_fields if field not in question)
+                return {
+                    'valid': False,
+                    'error': f'Question {i+1} missing required field: {missing}'
+                }
             
             # Validate concepts array
-            concepts = question.get('concepts', [])
-            if not isinstance(concepts, list):
+            if not isinstance(question.get('concepts', []), list):
                 return {
                     'valid': False,
                     'error': f'Question {i+1} has invalid concepts format'
                 }
             
-            # Validate difficulty
+            # Validate difficulty: float() per value, so lists and other
+            # non-scalars are rejected before they reach the pool arrays
             difficulty = question.get('difficulty')
             if difficulty is not None:
                 try:
@@ -193,34 +319,6 @@ class QuestionService:
         return {'valid': True}
     
     def _get_default_questions(self) -> List[Dict]:
-        """Get default questions for testing"""
-        return [
-            {
-                "id": "q1",
-                "content": "What is 15 + 27?",
-                "options": ["40", "42", "44", "46"],
-                "correct_answer": "42",
-                "concepts": [1, 0, 0, 0, 0],
-                "difficulty": 0.3,
-                "discrimination": 1.2
-            },
-            {
-                "id": "q2",
-                "content": "Solve for x: 2x + 5 = 15",
-                "options": ["3", "5", "7", "10"],
-                "correct_answer": "5",
-                "concepts": [1, 1, 0, 0, 0],
-                "difficulty": 0.6,
-                "discrimination": 1.5
-            },
-            {
-                "id": "q3",
-                "content": "What is the derivative of x²?",
-                "options": ["x", "2x", "x²", "2x²"],
-                "correct_answer": "2x",
-                "concepts": [1, 1, 1, 0, 0],
-                "difficulty": 0.8,
-                "discrimination": 1.8
-            }
-        ]
-
+        """Get default questions for testing (fresh copies of the read-only defaults)"""
+        return [dict(question, options=list(question['options']), concepts=list(question['concepts']))
+                for question in _DEFAULT_QUESTIONS]
@@ -1,25 +1,202 @@
 # app/services/redis_service.py - Redis Service (Minimal Hot Data Only)
+import os
 import redis
-import json
+import time
+import socket
+import orjson
 import logging
-from typing import Dict, Optional, List
+import threading
+from typing import Callable, Dict, Optional, List, Tuple
 from datetime import timedelta, datetime
+from cachetools import TTLCache
 
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the deployment image
+    ZSTD_AVAILABLE = False
+    logger.warning("zstandard not installed, caching question pools uncompressed")
+
+# Every zstd frame starts with this magic number; orjson output never does,
+# so readers can tell compressed payloads apart without a separate flag
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Pub/Sub channel carrying pool_ids whose per-worker caches must be dropped
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+# Sorted set of active session ids scored by last activity (unix time), so a
+# sweep finds inactive sessions without reading any session state
+ACTIVITY_KEY = 'sessions:activity'
+
+# Deletes the sessions ARGV[2..] (state keys in KEYS[2..]) that are still
+# inactive, i.e. whose ACTIVITY_KEY (KEYS[1]) score is <= ARGV[1]. Returns
+# {number of ids taken off ACTIVITY_KEY, ids whose state was actually removed};
+# the two differ for sessions whose state key already expired by TTL.
+# Re-checking the score here makes the sweep atomic against a session touched
+# after ZRANGEBYSCORE read it.
+CLEANUP_SESSIONS_LUA = """
+local processed = 0
+local removed = {}
+for i = 2, #KEYS do
+    local session_id = ARGV[i]
+    local score = redis.call('ZSCORE', KEYS[1], session_id)
+    if score and tonumber(score) <= tonumber(ARGV[1]) then
+        redis.call('ZREM', KEYS[1], session_id)
+        processed = processed + 1
+        if redis.call('DEL', KEYS[i]) == 1 then
+            removed[#removed + 1] = session_id
+        end
+    end
+end
+return {processed, removed}
+"""
+
+# Partial update of an existing session hash (KEYS[1]): HSETs the field/value
+# pairs in ARGV[4..] (values already JSON-encoded), refreshes the TTL (ARGV[1])
+# and the session's ACTIVITY_KEY (KEYS[2]) score ARGV[2] for member ARGV[3],
+# trimming members older than the TTL, atomically and in one round-trip. An
+# optional submission lock (KEYS[3]) is released either way. Returns 0 without
+# writing if the session is gone, so an expired session is never resurrected
+# with only a few fields.
+UPDATE_SESSION_LUA = """
+if KEYS[3] then
+    redis.call('DEL', KEYS[3])
+end
+if redis.call('TYPE', KEYS[1])['ok'] ~= 'hash' then
+    return 0
+end
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[1]))
+return 1
+"""
+
+# Session state lives in a hash with one JSON-encoded value per top-level field,
+# so a submit rewrites only the fields it changed instead of the whole blob
+SESSION_TTL = timedelta(minutes=30)  # 30-minute inactivity timeout
+
+
+def _touch_activity(pipe, session_id: str, now: float) -> None:
+    """Queue the ACTIVITY_KEY update for a session write at unix time `now` on `pipe`"""
+    pipe.zadd(ACTIVITY_KEY, {session_id: now})
+    # Members older than the TTL belong to sessions Redis has already expired
+    pipe.zremrangebyscore(ACTIVITY_KEY, '-inf', now - SESSION_TTL.total_seconds())
+
+
+def _encode_session_fields(state: Dict) -> Dict[str, bytes]:
+    """JSON-encode each top-level state field for HSET"""
+    return {
+        field: orjson.dumps(value, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+        for field, value in state.items()
+    }
+
+
+def _decode_session_fields(raw: Dict[str, str]) -> Dict:
+    """Inverse of _encode_session_fields for an HGETALL reply"""
+    return {field: orjson.loads(value) for field, value in raw.items()}
+
+
+def _without_answer(question: Dict) -> Dict:
+    """
+    The cacheable (answer-free) form of a question
+    Already-safe questions are returned as is; otherwise one C-level dict copy
+    plus a pop, instead of rebuilding the dict key by key
+    """
+    if 'correct_answer' not in question:
+        return question
+    safe_question = dict(question)
+    del safe_question['correct_answer']
+    return safe_question
+
+
+# zstd (de)compressor objects are not thread-safe, so each request thread keeps
+# its own pair and reuses the contexts instead of allocating them per payload
+_zstd_local = threading.local()
+
+
+def _zstd_contexts():
+    """This thread's (compressor, decompressor) pair"""
+    contexts = getattr(_zstd_local, 'contexts', None)
+    if contexts is None:
+        contexts = (zstandard.ZstdCompressor(level=3), zstandard.ZstdDecompressor())
+        _zstd_local.contexts = contexts
+    return contexts
+
+
+def _encode_payload(data: Dict) -> bytes:
+    """orjson-encode a cached pool/question, zstd-compressing large payloads"""
+    payload = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    if ZSTD_AVAILABLE and len(payload) >= Config.REDIS_COMPRESS_MIN_BYTES:
+        return _zstd_contexts()[0].compress(payload)
+    return payload
+
+
+def _decode_payload(payload: bytes) -> Dict:
+    """Inverse of _encode_payload"""
+    if payload[:4] == ZSTD_MAGIC:
+        payload = _zstd_contexts()[1].decompress(payload)
+    return orjson.loads(payload)
+
+# Process-wide connection pools, one per decode_responses setting, shared by
+# every RedisService instance. Keyed by pid as well so a worker forked from a
+# process that already built them gets its own (connections are never shared
+# across processes); building is lazy, so nothing connects before the fork.
+_pools: Dict[Tuple[int, bool], redis.BlockingConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _connection_pool(decode_responses: bool) -> redis.BlockingConnectionPool:
+    """This process's persistent, bounded pool of keep-alive connections"""
+    key = (os.getpid(), decode_responses)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            keepalive_options = {socket.TCP_KEEPIDLE: 60} if hasattr(socket, 'TCP_KEEPIDLE') else {}
+            pool = redis.BlockingConnectionPool(
+                host=Config.REDIS_HOST,
+                port=Config.REDIS_PORT,
+                password=Config.REDIS_PASSWORD,
+                db=Config.REDIS_DB,
+                decode_responses=decode_responses,
+                max_connections=Config.REDIS_MAX_CONNECTIONS,
+                timeout=Config.REDIS_POOL_TIMEOUT,
+                socket_keepalive=True,
+                socket_keepalive_options=keepalive_options
+            )
+            _pools[key] = pool
+        return pool
+
+
 class RedisService:
     """Redis service for HOT DATA ONLY - active session state and locks"""
 
     def __init__(self):
-        self.client = redis.Redis(
-            host=Config.REDIS_HOST,
-            port=Config.REDIS_PORT,
-            password=Config.REDIS_PASSWORD,
-            db=Config.REDIS_DB,
-            decode_responses=True
-        )
+        self.pool = _connection_pool(decode_responses=True)
+        self.client = redis.Redis(connection_pool=self.pool)
+        # redis-py picks the C hiredis reply parser automatically when it is installed
+        logger.info(f"Redis reply parser: {'hiredis' if redis.utils.HIREDIS_AVAILABLE else 'python'}")
+
+        # Cached pools and questions are read as raw bytes: orjson parses bytes
+        # directly (no utf-8 decode into a str first) and they may be zstd frames
+        self.raw_pool = _connection_pool(decode_responses=False)
+        self.raw_client = redis.Redis(connection_pool=self.raw_pool)
+
+        # Session state is deliberately not memoized per worker: submits are
+        # read-modify-write, and a worker-local copy would let two workers
+        # overwrite each other's updates. Individual cached questions (immutable
+        # per id) get an L1; pools have their own L1 in QuestionService.
+        self._question_l1 = TTLCache(maxsize=Config.L1_QUESTION_MAXSIZE, ttl=Config.L1_QUESTION_TTL)
+
+        # Loaded with SCRIPT LOAD on first use and called via EVALSHA afterwards
+        self._cleanup_script = self.client.register_script(CLEANUP_SESSIONS_LUA)
+        self._update_session_script = self.client.register_script(UPDATE_SESSION_LUA)
         logger.info("Redis service initialized (minimal hot data mode)")
     
     def test_connection(self) -> bool:
@@ -38,13 +215,17 @@ class RedisService:
         State includes: student_id, current_proficiency, next_question_id, status, questions_answered
         """
         try:
-            state['last_activity'] = datetime.now().isoformat()
+            state['last_activity'] = time.time()  # unix seconds, same as the ACTIVITY_KEY score
+            key = f"session:{session_id}:state"
+
+            # DEL first so a full write never keeps stale fields (or a legacy string key)
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=_encode_session_fields(state))
+                pipe.expire(key, SESSION_TTL)
+                _touch_activity(pipe, session_id, state['last_activity'])
+                pipe.execute()
 
-            self.client.setex(
-                f"session:{session_id}:state",
-                timedelta(minutes=30),  # 30-minute inactivity timeout
-                json.dumps(state, default=str)
-            )
             logger.debug(f"Stored session state for {session_id}")
             return True
         except Exception as e:
@@ -52,12 +233,21 @@ class RedisService:
             return False
 
     def get_session_state(self, session_id: str) -> Optional[Dict]:
-        """Get active session state from Redis"""
+        """Get active session state (always read from Redis)"""
         try:
-            data = self.client.get(f"session:{session_id}:state")
-            if data:
-                return json.loads(data)
-            return None
+            key = f"session:{session_id}:state"
+            try:
+                raw = self.client.hgetall(key)
+                state = _decode_session_fields(raw) if raw else None
+            except redis.ResponseError:
+                # WRONGTYPE: session started before state moved to a hash
+                data = self.client.get(key)
+                state = orjson.loads(data) if data else None
+                if state is not None:
+                    # Rewrite it as a hash so partial updates work from here on
+                    self.store_session_state(session_id, state)
+
+            return state
         except Exception as e:
             logger.error(f"Error getting session state: {str(e)}")
             return None
@@ -66,15 +256,15 @@ class RedisService:
                                    questions_answered: int) -> bool:
         """Update only proficiency and question count (fast partial update)"""
         try:
-            state = self.get_session_state(session_id)
-            if not state:
-                return False
-
-            state['current_proficiency'] = proficiency
-            state['questions_answered'] = questions_answered
-            state['last_activity'] = datetime.now().isoformat()
-
-            return self.store_session_state(session_id, state)
+            fields = {
+                'current_proficiency': proficiency,
+                'questions_answered': questions_answered,
+                'last_activity': time.time()
+            }
+            args = [int(SESSION_TTL.total_seconds()), fields['last_activity'], session_id]
+            for field, value in _encode_session_fields(fields).items():
+                args += [field, value]
+            return bool(self._update_session_script(keys=[f"session:{session_id}:state", ACTIVITY_KEY], args=args))
         except Exception as e:
             logger.error(f"Error updating proficiency: {str(e)}")
             return False
@@ -82,7 +272,11 @@ class RedisService:
     def delete_session_state(self, session_id: str) -> bool:
         """Delete session state from Redis"""
         try:
-            return bool(self.client.delete(f"session:{session_id}:state"))
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(f"session:{session_id}:state")
+                pipe.zrem(ACTIVITY_KEY, session_id)
+                deleted, _ = pipe.execute()
+            return bool(deleted)
         except Exception as e:
             logger.error(f"Error deleting session state: {str(e)}")
             return False
@@ -90,22 +284,25 @@ class RedisService:
     # ===== SUBMISSION LOCKS (PREVENT DOUBLE SUBMIT) =====
 
     def acquire_submission_lock(self, session_id: str, question_id: str,
-                               timeout_seconds: int = 5) -> bool:
+                               timeout_ms: int = 5000) -> bool:
         """
         Acquire a lock to prevent duplicate submissions
         Returns True if lock acquired, False if already locked
+
+        The lock is a single atomic SET NX PX; it never needs an explicit
+        release, the TTL frees it if the holder fails.
         """
         try:
             lock_key = f"lock:{session_id}:{question_id}"
-            # SET NX (set if not exists) with expiry
-            result = self.client.set(lock_key, "1", nx=True, ex=timeout_seconds)
+            # SET NX (set if not exists) with millisecond expiry
+            result = self.client.set(lock_key, "1", nx=True, px=timeout_ms)
             return bool(result)
         except Exception as e:
             logger.error(f"Error acquiring lock: {str(e)}")
             return False
 
     def release_submission_lock(self, session_id: str, question_id: str) -> bool:
-        """Release submission lock"""
+        """Release submission lock early (optional, the lock also expires on its own)"""
         try:
             lock_key = f"lock:{session_id}:{question_id}"
             return bool(self.client.delete(lock_key))
@@ -113,6 +310,84 @@ class RedisService:
             logger.error(f"Error releasing lock: {str(e)}")
             return False
 
+    def acquire_submission_locks_bulk(self, session_id: str, question_ids: List[str],
+                                      timeout_ms: int = 5000) -> List[bool]:
+        """
+        Acquire submission locks for several questions in one pipelined round-trip
+        Returns one flag per question_id, True where that lock was acquired
+        """
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for question_id in question_ids:
+                    pipe.set(f"lock:{session_id}:{question_id}", "1", nx=True, px=timeout_ms)
+                return [bool(result) for result in pipe.execute()]
+        except Exception as e:
+            logger.error(f"Error acquiring {len(question_ids)} locks: {str(e)}")
+            return [False] * len(question_ids)
+
+    def release_submission_locks_bulk(self, session_id: str, question_ids: List[str]) -> int:
+        """Release several submission locks with a single DEL; returns how many were held"""
+        if not question_ids:
+            return 0
+        try:
+            return self.client.delete(*[f"lock:{session_id}:{question_id}" for question_id in question_ids])
+        except Exception as e:
+            logger.error(f"Error releasing {len(question_ids)} locks: {str(e)}")
+            return 0
+
+    # ===== PIPELINED WRITES (ONE ROUND-TRIP PER SUBMIT) =====
+
+    def store_session_and_release(self, session_id: str, state: Dict, question_id: str,
+                                  changed: Optional[List[str]] = None) -> bool:
+        """
+        Store session state and release the submission lock in one round-trip
+
+        With `changed`, only those fields (plus last_activity) are written, through
+        UPDATE_SESSION_LUA: if the session expired or was cleaned up mid-request
+        nothing is written (the lock is still released) and False is returned.
+        Without it, the whole state replaces the hash in one MULTI/EXEC.
+        """
+        try:
+            state['last_activity'] = time.time()  # unix seconds, same as the ACTIVITY_KEY score
+            key = f"session:{session_id}:state"
+            lock_key = f"lock:{session_id}:{question_id}"
+
+            if changed is not None:
+                fields = {field: state[field] for field in changed}
+                fields['last_activity'] = state['last_activity']
+                args = [int(SESSION_TTL.total_seconds()), state['last_activity'], session_id]
+                for field, value in _encode_session_fields(fields).items():
+                    args += [field, value]
+                if not self._update_session_script(keys=[key, ACTIVITY_KEY, lock_key], args=args):
+                    logger.warning(f"Session {session_id} expired before its update was stored")
+                    return False
+                return True
+
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=_encode_session_fields(state))
+                pipe.expire(key, SESSION_TTL)
+                _touch_activity(pipe, session_id, state['last_activity'])
+                pipe.delete(lock_key)
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error storing session state and releasing lock: {str(e)}")
+            return False
+
+    def delete_session_and_release(self, session_id: str, question_id: str) -> bool:
+        """Delete session state and release the submission lock in one MULTI/EXEC"""
+        try:
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(f"session:{session_id}:state")
+                pipe.zrem(ACTIVITY_KEY, session_id)
+                pipe.delete(f"lock:{session_id}:{question_id}")
+                deleted, _, _ = pipe.execute()
+            return bool(deleted)
+        except Exception as e:
+            logger.error(f"Error deleting session state and releasing lock: {str(e)}")
+            return False
+
     # ===== QUESTION POOL CACHING (TIER 1 - HOT CACHE) =====
 
     def cache_question_pool(self, pool_id: str, pool_data: Dict,
@@ -126,10 +401,10 @@ class RedisService:
             pool_data['cached_at'] = datetime.now().isoformat()
             pool_data['cache_tier'] = 'redis'
 
-            self.client.setex(
+            self.raw_client.setex(
                 f"pool:{pool_id}",
                 timedelta(hours=ttl_hours),
-                json.dumps(pool_data, default=str)
+                _encode_payload(pool_data)
             )
             logger.info(f"Cached question pool {pool_id} in Redis (TTL: {ttl_hours}h)")
             return True
@@ -140,10 +415,10 @@ class RedisService:
     def get_cached_question_pool(self, pool_id: str) -> Optional[Dict]:
         """Get cached question pool from Redis (Tier 1)"""
         try:
-            data = self.client.get(f"pool:{pool_id}")
+            data = self.raw_client.get(f"pool:{pool_id}")
             if data:
                 logger.info(f"Cache HIT (Redis): pool {pool_id}")
-                return json.loads(data)
+                return _decode_payload(data)
 
             logger.info(f"Cache MISS (Redis): pool {pool_id}")
             return None
@@ -151,10 +426,26 @@ class RedisService:
             logger.error(f"Error getting cached pool: {str(e)}")
             return None
 
+    def get_cached_question_pools(self, pool_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get several cached question pools from Redis (Tier 1) with one MGET"""
+        if not pool_ids:
+            return {}
+        try:
+            values = self.raw_client.mget([f"pool:{pool_id}" for pool_id in pool_ids])
+            return {pool_id: _decode_payload(data) if data else None
+                    for pool_id, data in zip(pool_ids, values)}
+        except Exception as e:
+            logger.error(f"Error getting cached pools: {str(e)}")
+            return {pool_id: None for pool_id in pool_ids}
+
     def invalidate_question_pool(self, pool_id: str) -> bool:
-        """Invalidate/delete question pool from Redis cache"""
+        """
+        Invalidate/delete question pool from Redis cache
+        UNLINK removes the key at once but frees the (possibly large) blob on a
+        background thread, on the primary and on replicas, so it never blocks Redis
+        """
         try:
-            deleted = self.client.delete(f"pool:{pool_id}")
+            deleted = self.client.unlink(f"pool:{pool_id}")
             if deleted:
                 logger.info(f"Invalidated question pool {pool_id} from Redis")
             return bool(deleted)
@@ -162,6 +453,42 @@ class RedisService:
             logger.error(f"Error invalidating pool: {str(e)}")
             return False
 
+    # ===== CROSS-WORKER INVALIDATION (PUB/SUB) =====
+
+    def publish_invalidation(self, pool_id: str) -> bool:
+        """Tell every worker to drop its process-local copies of a pool"""
+        try:
+            receivers = self.client.publish(INVALIDATION_CHANNEL, pool_id)
+            logger.info(f"Published invalidation for pool {pool_id} to {receivers} workers")
+            return True
+        except Exception as e:
+            logger.error(f"Error publishing invalidation: {str(e)}")
+            return False
+
+    def subscribe_invalidations(self, callback: Callable[[str], None]) -> threading.Thread:
+        """
+        Run `callback(pool_id)` for every invalidation published by any worker
+        Listens on a daemon thread and resubscribes after connection errors
+        """
+        def _listen():
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(INVALIDATION_CHANNEL)
+                    for message in pubsub.listen():
+                        try:
+                            callback(message['data'])
+                        except Exception as e:
+                            logger.error(f"Error handling invalidation {message['data']}: {str(e)}")
+                except Exception as e:
+                    logger.warning(f"Invalidation listener disconnected, retrying in 5s: {str(e)}")
+                    time.sleep(5)
+
+        thread = threading.Thread(target=_listen, daemon=True, name="cache-invalidation-listener")
+        thread.start()
+        logger.info(f"Subscribed to cache invalidations on '{INVALIDATION_CHANNEL}'")
+        return thread
+
     # ===== INDIVIDUAL QUESTION CACHING (OPTIONAL) =====
 
     def cache_question(self, question_id: str, question_data: Dict,
@@ -169,69 +496,122 @@ class RedisService:
         """Cache a frequently accessed question (without correct answer for security)"""
         try:
             # Remove correct_answer before caching
-            safe_question = {k: v for k, v in question_data.items()
-                           if k != 'correct_answer'}
+            safe_question = _without_answer(question_data)
 
-            self.client.setex(
+            self.raw_client.setex(
                 f"question:{question_id}",
                 timedelta(hours=ttl_hours),
-                json.dumps(safe_question, default=str)
+                _encode_payload(safe_question)
             )
+            self._question_l1[question_id] = safe_question
             return True
         except Exception as e:
             logger.error(f"Error caching question: {str(e)}")
             return False
 
+    def cache_questions_bulk(self, questions: List[Dict], ttl_hours: int = 1) -> bool:
+        """Cache many questions (without correct answers) in one pipelined round-trip"""
+        try:
+            ttl = timedelta(hours=ttl_hours)
+            with self.raw_client.pipeline(transaction=False) as pipe:
+                for question in questions:
+                    safe_question = _without_answer(question)
+                    pipe.setex(f"question:{question['id']}", ttl, _encode_payload(safe_question))
+                    self._question_l1[question['id']] = safe_question
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error caching {len(questions)} questions: {str(e)}")
+            return False
+
     def get_cached_question(self, question_id: str) -> Optional[Dict]:
-        """Get cached question (returns None if not cached)"""
+        """Get cached question, L1 first, then Redis (returns None if not cached)"""
         try:
-            data = self.client.get(f"question:{question_id}")
+            cached = self._question_l1.get(question_id)
+            if cached is not None:
+                return dict(cached)
+
+            data = self.raw_client.get(f"question:{question_id}")
             if data:
-                return json.loads(data)
+                question = _decode_payload(data)
+                self._question_l1[question_id] = question
+                return dict(question)
             return None
         except Exception as e:
             logger.error(f"Error getting cached question: {str(e)}")
             return None
 
+    def get_cached_questions(self, question_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get several cached questions, L1 first, then one MGET for the rest"""
+        found = {}
+        missing = []
+        for question_id in question_ids:
+            cached = self._question_l1.get(question_id)
+            if cached is not None:
+                found[question_id] = dict(cached)
+            else:
+                missing.append(question_id)
+
+        if missing:
+            try:
+                values = self.raw_client.mget([f"question:{question_id}" for question_id in missing])
+                for question_id, data in zip(missing, values):
+                    if data:
+                        question = _decode_payload(data)
+                        self._question_l1[question_id] = question
+                        found[question_id] = dict(question)
+            except Exception as e:
+                logger.error(f"Error getting {len(missing)} cached questions: {str(e)}")
+
+        return {question_id: found.get(question_id) for question_id in question_ids}
+
+    def evict_cached_questions(self, question_ids: List[str]) -> None:
+        """Drop questions from this worker's L1 (Redis copies expire on their own)"""
+        for question_id in question_ids:
+            self._question_l1.pop(question_id, None)
+
     # ===== CLEANUP & MONITORING =====
 
     def get_all_session_keys(self) -> List[str]:
-        """Get all session state keys"""
+        """
+        Get the ids of all live sessions
+        Read off the activity sorted set (members touched within the TTL), so
+        neither the keyspace nor any session payload is walked
+        """
         try:
-            return [key.replace('session:', '').replace(':state', '')
-                    for key in self.client.keys('session:*:state')]
+            return self.client.zrangebyscore(
+                ACTIVITY_KEY, time.time() - SESSION_TTL.total_seconds(), '+inf'
+            )
         except Exception as e:
             logger.error(f"Error getting all sessions: {str(e)}")
             return []
 
-    def cleanup_inactive_sessions(self, inactivity_minutes: int = 30) -> int:
-        """Remove sessions inactive for more than specified minutes"""
+    def cleanup_inactive_sessions(self, inactivity_minutes: int = 30, batch_size: int = 500) -> int:
+        """
+        Remove sessions inactive for more than specified minutes
+
+        Not needed for normal expiry (the state key's TTL handles that); this is
+        the manual sweep behind /api/sessions/cleanup for shorter thresholds.
+        Inactive ids come straight off the activity sorted set (ZRANGEBYSCORE),
+        so no session state is read; each batch is then deleted by a Lua script
+        in one round-trip.
+        """
         try:
             cleanup_count = 0
-            current_time = datetime.now()
-            inactivity_threshold = timedelta(minutes=inactivity_minutes)
-
-            # Get all session state keys
-            session_keys = self.client.keys('session:*:state')
-
-            for key in session_keys:
-                try:
-                    data = self.client.get(key)
-                    if data:
-                        session_data = json.loads(data)
-                        last_activity_str = session_data.get('last_activity')
-
-                        if last_activity_str:
-                            last_activity = datetime.fromisoformat(last_activity_str)
-                            time_since_activity = current_time - last_activity
-
-                            if time_since_activity > inactivity_threshold:
-                                self.client.delete(key)
-                                cleanup_count += 1
-                                logger.info(f"Cleaned up inactive session: {key}")
-                except Exception as e:
-                    logger.error(f"Error processing session {key}: {str(e)}")
-                    continue
+            cutoff = time.time() - inactivity_minutes * 60
+
+            while True:
+                session_ids = self.client.zrangebyscore(
+                    ACTIVITY_KEY, '-inf', cutoff, start=0, num=batch_size
+                )
+                if not session_ids:
+                    break
+                processed, removed = self._cleanup_batch(session_ids, cutoff)
+                cleanup_count += removed
+                # Stop on a short batch, or one where no id left the sorted set
+                # (every id was touched since the read), which would be read again
+                if len(session_ids) < batch_size or not processed:
+                    break
 
             logger.info(f"Cleaned up {cleanup_count} inactive sessions")
             return cleanup_count
@@ -240,22 +620,54 @@ class RedisService:
             logger.error(f"Error during session cleanup: {str(e)}")
             return 0
 
-    def get_stats(self) -> Dict:
-        """Get Redis statistics for monitoring"""
-        try:
-            session_count = len(self.client.keys('session:*:state'))
-            lock_count = len(self.client.keys('lock:*'))
-            question_cache_count = len(self.client.keys('question:*'))
+    def _cleanup_batch(self, session_ids: List[str], cutoff: float) -> Tuple[int, int]:
+        """
+        Run the cleanup script over one batch of ids
+        Returns (ids taken off ACTIVITY_KEY, sessions whose state was deleted)
+        Script errors propagate: the ids would stay in ACTIVITY_KEY, so swallowing
+        them would make the caller read the same batch again forever
+        """
+        processed, removed = self._cleanup_script(
+            keys=[ACTIVITY_KEY] + [f"session:{session_id}:state" for session_id in session_ids],
+            args=[cutoff] + session_ids
+        )
+
+        for session_id in removed:
+            logger.info(f"Cleaned up inactive session: {session_id}")
+        return processed, len(removed)
 
-            info = self.client.info('memory')
+    def get_stats(self, scan_keys: bool = False) -> Dict:
+        """
+        Get Redis statistics for monitoring
 
-            return {
+        Active sessions come from the activity sorted set (ZCOUNT), so the default
+        is one pipelined round-trip of O(log N) / O(1) commands. Locks and cached
+        questions only live as TTL'd keys (no counter could follow their expiry),
+        so they are counted only with scan_keys=True, via one incremental SCAN pass.
+        """
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.zcount(ACTIVITY_KEY, time.time() - SESSION_TTL.total_seconds(), '+inf')
+                pipe.info('memory')
+                pipe.dbsize()
+                session_count, info, total_keys = pipe.execute()
+
+            stats = {
                 'active_sessions': session_count,
-                'active_locks': lock_count,
-                'cached_questions': question_cache_count,
                 'memory_used_mb': round(info.get('used_memory', 0) / (1024 * 1024), 2),
-                'total_keys': self.client.dbsize()
+                'total_keys': total_keys
             }
+
+            if scan_keys:
+                lock_count = question_cache_count = 0
+                for key in self.client.scan_iter(count=1000):
+                    if key.startswith('lock:'):
+                        lock_count += 1
+                    elif key.startswith('question:'):
+                        question_cache_count += 1
+                stats.update(active_locks=lock_count, cached_questions=question_cache_count)
+
+            return stats
         except Exception as e:
             logger.error(f"Error getting stats: {str(e)}")
             return {}
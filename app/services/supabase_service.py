@@ -1,14 +1,73 @@
 import os
 import json
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import time
+import random
+from typing import Callable, Dict, List, Optional, Any
+from datetime import datetime, timedelta, timezone
 import logging
+import threading
+import httpx
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+from postgrest.utils import SyncClient
 from supabase import create_client, Client
 
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg.types.json import Jsonb
+    PSYCOPG_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the deployment image
+    PSYCOPG_AVAILABLE = False
+    logger.warning("psycopg not installed, bulk question loads go through PostgREST")
+
+# Columns of a cached pool question, in the internal question format
+POOL_QUESTION_COLUMNS = (
+    'id,content,options,correct_answer,concepts,difficulty,discrimination,guessing,'
+    'topic_id,chapter_id,subject_id,class_id,exam_id'
+)
+
+# Columns _question_from_row reads; selecting only these skips created_at and
+# anything else stored on the row
+QUESTION_COLUMNS = 'id,content,options,correct_answer,concepts,difficulty,discrimination'
+
+# The request never reached the server, so resending it cannot duplicate a write
+UNSENT_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# The request may have been applied before the failure; only idempotent writes resend
+UNANSWERED_REQUEST_ERRORS = (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError)
+
+# Postgres SQLSTATE classes that clear up on their own: connection exception,
+# insufficient resources, operator intervention (e.g. admin shutdown)
+TRANSIENT_SQLSTATE_PREFIXES = ('08', '53', '57')
+
+# Question columns stored as JSON; COPY sends them as JSON text
+QUESTION_JSON_COLUMNS = frozenset(('options', 'concepts'))
+
+# test_sessions columns renamed by PostgREST (alias:column) into the response
+# shapes, so rows are returned as they arrive instead of rebuilt per session
+TEST_HISTORY_COLUMNS = (
+    'session_id:id,started_at,completed_at,total_questions,accuracy,status,'
+    'learning_gain,final_proficiency'
+)
+PROGRESS_TIMELINE_COLUMNS = (
+    'date:completed_at,proficiency:final_proficiency,accuracy,'
+    'questions_answered:total_questions'
+)
+
+def _orjson_response(response: httpx.Response):
+    """httpx response hook: decode the body with orjson when PostgREST calls .json()"""
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, which is what
+    # postgrest catches for empty (returning=minimal) and non-JSON bodies
+    response.json = lambda **kwargs: orjson.loads(response.content)
+
+
 class SupabaseService:
     """Service for interacting with Supabase database"""
     
@@ -20,8 +79,93 @@ class SupabaseService:
             raise ValueError("Supabase URL and key must be provided in environment variables")
         
         self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        self._tune_postgrest_session()
+
+        # Threads for overlapping independent reads inside one service call
+        # (supabase-py is synchronous; the GIL is released while waiting on sockets)
+        self.io_executor = ThreadPoolExecutor(max_workers=Config.SUPABASE_IO_WORKERS,
+                                              thread_name_prefix='supabase-read')
+
+        # Read-mostly student lookups (student rows, concept lists) are memoized per worker;
+        # only successful lookups are cached so fallbacks and misses are retried
+        self._student_l1 = TTLCache(maxsize=Config.L1_STUDENT_MAXSIZE, ttl=Config.L1_STUDENT_TTL)
+        self._concept_names_l1 = TTLCache(maxsize=Config.L1_STUDENT_MAXSIZE, ttl=Config.L1_STUDENT_TTL)
+        # Decoded Tier 2 pools, so repeat reads skip both PostgREST queries; entries are
+        # dropped on invalidation here and, via Pub/Sub, on every other worker
+        self._tier2_pool_l1 = TTLCache(maxsize=Config.L1_POOL_MAXSIZE, ttl=Config.L1_POOL_TTL)
         logger.info("Initialized Supabase service")
     
+    def _tune_postgrest_session(self):
+        """
+        Swap PostgREST's default httpx client for one with explicit pool limits,
+        keep-alive and timeouts, so bursts of submits reuse warm connections
+        HTTPTransport retries only failed connects, never a request that was sent;
+        response bodies are parsed with orjson rather than the stdlib json
+        """
+        try:
+            postgrest = self.client.postgrest
+            default_session = postgrest.session
+            postgrest.session = SyncClient(
+                base_url=default_session.base_url,
+                headers=default_session.headers,
+                timeout=httpx.Timeout(Config.SUPABASE_HTTP_TIMEOUT, connect=5.0),
+                event_hooks={'response': [_orjson_response]},
+                transport=httpx.HTTPTransport(
+                    retries=Config.SUPABASE_HTTP_RETRIES,
+                    limits=httpx.Limits(
+                        max_connections=Config.SUPABASE_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=Config.SUPABASE_HTTP_KEEPALIVE,
+                        keepalive_expiry=60
+                    )
+                )
+            )
+            default_session.close()
+        except Exception as e:
+            logger.warning(f"Keeping the default PostgREST HTTP client: {str(e)}")
+
+    def _execute_with_retry(self, request: Callable[[], Any], idempotent: bool = True) -> Any:
+        """
+        Run a PostgREST request, retrying transient failures with jittered
+        exponential backoff (SUPABASE_RETRY_ATTEMPTS retries)
+
+        `request` must build its query when called, so each attempt is a fresh
+        request. A broken connection is not reused: httpx's pool drops it and the
+        next attempt opens a new one, so the shared client is never rebuilt under
+        requests still in flight on it. Requests that never went out are always
+        retried; timeouts, dropped responses and 5xx only when `idempotent`,
+        since the first attempt may already have been applied. Anything else,
+        and the last failure, is raised to the caller.
+        """
+        base = Config.SUPABASE_RETRY_BASE_DELAY
+        for attempt in range(Config.SUPABASE_RETRY_ATTEMPTS + 1):
+            try:
+                return request()
+            except Exception as e:
+                retryable = isinstance(e, UNSENT_REQUEST_ERRORS) or (
+                    idempotent and (isinstance(e, UNANSWERED_REQUEST_ERRORS) or self._is_server_error(e))
+                )
+                if not retryable or attempt == Config.SUPABASE_RETRY_ATTEMPTS:
+                    raise
+                delay = base * 2 ** attempt + random.uniform(0, base)
+                logger.warning(f"Transient Supabase error, retrying in {delay:.2f}s: {str(e)}")
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_server_error(e: Exception) -> bool:
+        """True for a 5xx response or a Postgres error class that clears up on its own"""
+        if not isinstance(e, APIError):
+            return False
+        code = str(e.code or '')
+        return (len(code) == 3 and code.startswith('5')) or code.startswith(TRANSIENT_SQLSTATE_PREFIXES)
+
+    def close(self):
+        """Close the pooled HTTP connections (on shutdown)"""
+        self.io_executor.shutdown(wait=False)
+        try:
+            self.client.postgrest.session.close()
+        except Exception as e:
+            logger.error(f"Error closing Supabase HTTP client: {str(e)}")
+
     def test_connection(self) -> bool:
         """Test the connection to Supabase"""
         try:
@@ -40,18 +184,17 @@ class SupabaseService:
             result = self.client.table('students').select('*').eq('id', student_id).execute()
             
             if result.data:
+                self._student_l1[student_id] = result.data[0]
                 return result.data[0]
             
-            # Create new student
-            student_data = {
-                'id': student_id,
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat()
-            }
+            # Create new student (created_at/updated_at are column defaults)
+            student_data = {'id': student_id}
             
             result = self.client.table('students').insert(student_data).execute()
+            if result.data:
+                self._student_l1[student_id] = result.data[0]
             
-            # Initialize proficiency for all concepts
+            # Initialize proficiency for all concepts (also drops any memoized concept list)
             self.create_user_proficiency(student_id, [0.5] * len(concept_names), concept_names)
             
             logger.info(f"Created new student: {student_id}")
@@ -63,9 +206,15 @@ class SupabaseService:
     
     def get_student(self, student_id: str) -> Optional[Dict]:
         """Get student by ID"""
+        cached = self._student_l1.get(student_id)
+        if cached is not None:
+            return cached
         try:
             result = self.client.table('students').select('*').eq('id', student_id).execute()
-            return result.data[0] if result.data else None
+            if not result.data:
+                return None
+            self._student_l1[student_id] = result.data[0]
+            return result.data[0]
         except Exception as e:
             logger.error(f"Error getting student: {str(e)}")
             return None
@@ -75,19 +224,19 @@ class SupabaseService:
                                concept_names: List[str]) -> bool:
         """Create initial user proficiency record"""
         try:
-            # Create individual records for each concept
-            proficiency_records = []
-            for i, concept_name in enumerate(concept_names):
-                proficiency_records.append({
-                    'student_id': student_id,
-                    'concept_name': concept_name,
-                    'proficiency_value': proficiency[i] if i < len(proficiency) else 0.5,
-                    'confidence': 0.0,  # Low initial confidence
-                    'created_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
-                })
+            # Create individual records for each concept; Postgres stamps
+            # created_at/updated_at from the column defaults
+            proficiency_records = [{
+                'student_id': student_id,
+                'concept_name': concept_name,
+                'proficiency_value': proficiency[i] if i < len(proficiency) else 0.5,
+                'confidence': 0.0  # Low initial confidence
+            } for i, concept_name in enumerate(concept_names)]
             
-            result = self.client.table('student_proficiencies').insert(proficiency_records).execute()
+            self.client.table('student_proficiencies').insert(
+                proficiency_records, returning=ReturnMethod.minimal
+            ).execute()
+            self._concept_names_l1.pop(student_id, None)
             logger.info(f"Created proficiency records for student {student_id}")
             return True
             
@@ -98,7 +247,9 @@ class SupabaseService:
     def get_current_proficiency(self, student_id: str) -> List[float]:
         """Get current user proficiency"""
         try:
-            result = self.client.table('student_proficiencies').select('*').eq('student_id', student_id).order('concept_name').execute()
+            # Walks uq_student_proficiencies_student_concept in concept_name order
+            result = self.client.table('student_proficiencies').select('proficiency_value').eq(
+                'student_id', student_id).order('concept_name').execute()
             
             if result.data:
                 return [record['proficiency_value'] for record in result.data]
@@ -109,36 +260,69 @@ class SupabaseService:
             return []
     
     def get_concept_names(self, student_id: str) -> List[str]:
-        """Get concept names for student"""
+        """Get concept names for student (the default five if none are stored or the lookup fails)"""
+        concept_names = self.get_stored_concept_names(student_id)
+        if concept_names is None:
+            return ['Math', 'Algebra', 'Geometry', 'Statistics', 'Calculus']
+        return concept_names
+
+    def get_stored_concept_names(self, student_id: str) -> Optional[List[str]]:
+        """
+        Concept names of the student's stored proficiency rows, in concept_name order
+        None if the student has no rows or the lookup fails, so writes keyed by
+        concept never invent rows from the display defaults
+        """
+        cached = self._concept_names_l1.get(student_id)
+        if cached is not None:
+            return list(cached)
         try:
             result = self.client.table('student_proficiencies').select('concept_name').eq('student_id', student_id).order('concept_name').execute()
-            
-            if result.data:
-                return [record['concept_name'] for record in result.data]
-            return ['Math', 'Algebra', 'Geometry', 'Statistics', 'Calculus']
-            
+            if not result.data:
+                return None
+            concept_names = [record['concept_name'] for record in result.data]
+            self._concept_names_l1[student_id] = tuple(concept_names)
+            return concept_names
+
         except Exception as e:
             logger.error(f"Error getting concept names: {str(e)}")
-            return ['Math', 'Algebra', 'Geometry', 'Statistics', 'Calculus']
+            return None
+    
+    def clear_student_cache(self, student_id: Optional[str] = None):
+        """Drop memoized student/concept lookups for one student, or for everyone"""
+        if student_id is None:
+            self._student_l1.clear()
+            self._concept_names_l1.clear()
+        else:
+            self._student_l1.pop(student_id, None)
+            self._concept_names_l1.pop(student_id, None)
     
     def update_user_proficiency(self, student_id: str, proficiency: List[float]) -> bool:
-        """Update user proficiency"""
+        """
+        Update user proficiency
+        One upsert on (student_id, concept_name) (PERFORMANCE_MIGRATION.sql); the
+        concept order comes from the memoized get_stored_concept_names, so no SELECT.
+        Nothing is written unless the student's rows already exist.
+        """
         try:
-            # Get existing proficiency records
-            result = self.client.table('student_proficiencies').select('*').eq('student_id', student_id).order('concept_name').execute()
-            
-            if not result.data or len(result.data) != len(proficiency):
+            concept_names = self.get_stored_concept_names(student_id)
+            if concept_names is None:
+                logger.error(f"No stored proficiency rows for {student_id}, skipping update")
+                return False
+            if len(concept_names) != len(proficiency):
                 logger.error(f"Proficiency length mismatch for {student_id}")
                 return False
             
-            # Update each proficiency record
-            for i, record in enumerate(result.data):
-                update_data = {
-                    'proficiency_value': proficiency[i],
-                    'updated_at': datetime.now().isoformat()
-                }
-                
-                self.client.table('student_proficiencies').update(update_data).eq('id', record['id']).execute()
+            now = datetime.now().isoformat()
+            records = [{
+                'student_id': student_id,
+                'concept_name': concept_name,
+                'proficiency_value': value,
+                'updated_at': now
+            } for concept_name, value in zip(concept_names, proficiency)]
+            
+            self._execute_with_retry(lambda: self.client.table('student_proficiencies').upsert(
+                records, on_conflict='student_id,concept_name', returning=ReturnMethod.minimal
+            ).execute())
             
             logger.info(f"Updated proficiency for student {student_id}")
             return True
@@ -151,7 +335,10 @@ class SupabaseService:
     def store_response(self, student_id: str, session_id: str, question_id: str, 
                       response: int, proficiency_before: List[float], 
                       proficiency_after: List[float]) -> bool:
-        """Store user response and proficiency changes"""
+        """
+        Store user response and proficiency changes
+        The submit path uses record_response; this stores only the response row
+        """
         try:
             data = {
                 'student_id': student_id,
@@ -160,11 +347,17 @@ class SupabaseService:
                 'response': response,
                 'is_correct': response,  # Assuming response is 0/1
                 'proficiency_before': proficiency_before,
-                'proficiency_after': proficiency_after,
-                'timestamp': datetime.now().isoformat()
+                'proficiency_after': proficiency_after
+                # timestamp: column default, stamped by Postgres
             }
             
-            result = self.client.table('test_responses').insert(data).execute()
+            # A plain insert: only retried when the request never went out
+            self._execute_with_retry(
+                lambda: self.client.table('test_responses').insert(
+                    data, returning=ReturnMethod.minimal
+                ).execute(),
+                idempotent=False
+            )
             logger.info(f"Stored response for student {student_id}, question {question_id}")
             return True
             
@@ -172,6 +365,50 @@ class SupabaseService:
             logger.error(f"Error storing response: {str(e)}")
             return False
     
+    def record_response(self, student_id: str, session_id: str, question_id: str,
+                        response: int, proficiency_before: List[float],
+                        proficiency_after: List[float]) -> bool:
+        """
+        Store a response, upsert the new proficiency and touch the session's
+        last_activity in one request and one transaction (submit_response, see
+        PERFORMANCE_MIGRATION.sql), instead of store_response,
+        update_user_proficiency and update_session_activity
+        """
+        try:
+            # Same outcomes as update_user_proficiency: without stored rows (or on a
+            # length mismatch) no proficiency is written, but the response still is
+            concept_names = self.get_stored_concept_names(student_id)
+            if concept_names is None:
+                logger.error(f"No stored proficiency rows for {student_id}, recording the response only")
+                concept_names, proficiency_values = [], []
+            elif len(concept_names) != len(proficiency_after):
+                logger.error(f"Proficiency length mismatch for {student_id}")
+                concept_names, proficiency_values = [], []
+            else:
+                proficiency_values = proficiency_after
+
+            params = {
+                'p_student_id': student_id,
+                'p_session_id': session_id,
+                'p_question_id': question_id,
+                'p_response': response,
+                'p_proficiency_before': proficiency_before,
+                'p_proficiency_after': proficiency_after,
+                'p_concept_names': concept_names,
+                'p_proficiency_values': proficiency_values
+            }
+            # Inserts a response row, so only unsent requests are resent
+            self._execute_with_retry(
+                lambda: self.client.rpc('submit_response', params).execute(),
+                idempotent=False
+            )
+            logger.info(f"Recorded response for student {student_id}, question {question_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error recording response: {str(e)}")
+            return False
+
     def get_user_responses(self, student_id: str, session_id: Optional[str] = None) -> List[Dict]:
         """Get user response history"""
         try:
@@ -191,6 +428,7 @@ class SupabaseService:
     def store_test_summary(self, student_id: str, session_id: str, test_summary: Dict) -> bool:
         """Store test session summary"""
         try:
+            now = datetime.now().isoformat()
             data = {
                 'id': session_id,
                 'student_id': student_id,
@@ -202,12 +440,12 @@ class SupabaseService:
                 'learning_gain': test_summary.get('learning_gain', 0.0),
                 'test_efficiency': test_summary.get('test_efficiency', 0.0),
                 'status': 'completed',
-                'started_at': datetime.now().isoformat(),
-                'completed_at': datetime.now().isoformat()
+                'started_at': now,
+                'completed_at': now
             }
             
             # Upsert test session data
-            result = self.client.table('test_sessions').upsert(data).execute()
+            self.client.table('test_sessions').upsert(data, returning=ReturnMethod.minimal).execute()
             logger.info(f"Stored test summary for student {student_id}")
             return True
             
@@ -218,22 +456,9 @@ class SupabaseService:
     def get_test_history(self, student_id: str) -> List[Dict]:
         """Get test history for a student"""
         try:
-            result = self.client.table('test_sessions').select('*').eq('student_id', student_id).order('completed_at', desc=True).execute()
-            
-            history = []
-            for session in result.data:
-                history.append({
-                    'session_id': session['id'],
-                    'started_at': session.get('started_at'),
-                    'completed_at': session.get('completed_at'),
-                    'total_questions': session.get('total_questions', 0),
-                    'accuracy': session.get('accuracy', 0.0),
-                    'status': session.get('status', 'completed'),
-                    'learning_gain': session.get('learning_gain', 0.0),
-                    'final_proficiency': session.get('final_proficiency', [])
-                })
-            
-            return history
+            result = self.client.table('test_sessions').select(TEST_HISTORY_COLUMNS).eq(
+                'student_id', student_id).order('completed_at', desc=True).execute()
+            return result.data
             
         except Exception as e:
             logger.error(f"Error getting test history: {str(e)}")
@@ -242,34 +467,34 @@ class SupabaseService:
     def get_learning_progress(self, student_id: str) -> Dict:
         """Get student's learning progress over time"""
         try:
-            # Get all completed test sessions
-            result = self.client.table('test_sessions').select('*').eq('student_id', student_id).eq('status', 'completed').order('completed_at').execute()
-
-            sessions = result.data
-            if not sessions:
+            # The concept names are independent of the sessions query, so fetch them
+            # alongside it (unless memoized) instead of after it
+            concept_names_future = None
+            if student_id not in self._concept_names_l1:
+                concept_names_future = self.io_executor.submit(self.get_concept_names, student_id)
+
+            # Get all completed test sessions, already in timeline shape (the
+            # timeline needs every row, so the average is taken from these
+            # rather than from a second aggregate query)
+            result = self.client.table('test_sessions').select(PROGRESS_TIMELINE_COLUMNS).eq(
+                'student_id', student_id).eq('status', 'completed').order('completed_at').execute()
+
+            timeline = result.data
+            if not timeline:
                 return {'progress_timeline': [], 'concept_progress': {}}
 
-            # Build timeline
-            timeline = []
-            for session in sessions:
-                timeline.append({
-                    'date': session.get('completed_at'),
-                    'proficiency': session.get('final_proficiency', []),
-                    'accuracy': session.get('accuracy', 0.0),
-                    'questions_answered': session.get('total_questions', 0)
-                })
-
             # Calculate concept-specific progress
-            concept_names = self.get_concept_names(student_id)
+            concept_names = (concept_names_future.result() if concept_names_future
+                             else self.get_concept_names(student_id))
             concept_progress = {}
 
             for i, concept in enumerate(concept_names):
                 concept_values = []
-                for session in sessions:
-                    final_prof = session.get('final_proficiency', [])
+                for entry in timeline:
+                    final_prof = entry['proficiency']
                     if final_prof and i < len(final_prof):
                         concept_values.append({
-                            'date': session.get('completed_at'),
+                            'date': entry['date'],
                             'value': final_prof[i]
                         })
 
@@ -282,8 +507,8 @@ class SupabaseService:
             return {
                 'progress_timeline': timeline,
                 'concept_progress': concept_progress,
-                'total_sessions': len(sessions),
-                'avg_accuracy': sum(s.get('accuracy', 0) for s in sessions) / len(sessions)
+                'total_sessions': len(timeline),
+                'avg_accuracy': sum(entry['accuracy'] for entry in timeline) / len(timeline)
             }
 
         except Exception as e:
@@ -297,6 +522,8 @@ class SupabaseService:
         Stores both metadata and questions
         """
         try:
+            self._tier2_pool_l1.pop(pool_id, None)
+
             # Store pool metadata in question_pools table
             pool_metadata = {
                 'id': pool_id,
@@ -307,37 +534,39 @@ class SupabaseService:
                 'total_questions': pool_data.get('total_questions', 0),
                 'metadata': pool_data.get('metadata', {}),
                 'cached_at': datetime.now().isoformat(),
-                'expires_at': (datetime.now().timestamp() + Config.SUPABASE_CACHE_EXPIRY).__str__()
+                'expires_at': (datetime.now(timezone.utc)
+                               + timedelta(seconds=Config.SUPABASE_CACHE_EXPIRY)).isoformat()
             }
 
             # Upsert pool metadata
-            self.client.table('question_pools').upsert(pool_metadata).execute()
+            self.client.table('question_pools').upsert(pool_metadata, returning=ReturnMethod.minimal).execute()
 
             # Store individual questions
             questions = pool_data.get('questions', [])
             if questions:
-                question_records = []
-                for question in questions:
-                    question_records.append({
-                        'id': question['id'],
-                        'pool_id': pool_id,
-                        'content': question['content'],
-                        'options': question.get('options', []),
-                        'correct_answer': question['correct_answer'],
-                        'concepts': question.get('concepts', [1, 0, 0, 0, 0]),
-                        'difficulty': question.get('difficulty', 0.5),
-                        'discrimination': question.get('discrimination', 1.0),
-                        'guessing': question.get('guessing', 0.25),
-                        'topic_id': question.get('topic_id'),
-                        'chapter_id': question.get('chapter_id'),
-                        'subject_id': question.get('subject_id'),
-                        'class_id': question.get('class_id'),
-                        'exam_id': question.get('exam_id'),
-                        'created_at': datetime.now().isoformat()
-                    })
-
-                # Upsert questions (update if exists, insert if not)
-                self.client.table('questions').upsert(question_records).execute()
+                # created_at is left to the column default, so a re-cache keeps it
+                question_records = [{
+                    'id': question['id'],
+                    'pool_id': pool_id,
+                    'content': question['content'],
+                    'options': question.get('options', []),
+                    'correct_answer': question['correct_answer'],
+                    'concepts': question.get('concepts', [1, 0, 0, 0, 0]),
+                    'difficulty': question.get('difficulty', 0.5),
+                    'discrimination': question.get('discrimination', 1.0),
+                    'guessing': question.get('guessing', 0.25),
+                    'topic_id': question.get('topic_id'),
+                    'chapter_id': question.get('chapter_id'),
+                    'subject_id': question.get('subject_id'),
+                    'class_id': question.get('class_id'),
+                    'exam_id': question.get('exam_id')
+                } for question in questions]
+
+                # Upsert questions (update if exists, insert if not): large pools
+                # are COPYed directly, otherwise upserted in bounded chunks so
+                # they stay under PostgREST payload/timeout limits
+                if not self.bulk_store_questions(question_records, upsert=True):
+                    self._upsert_chunked('questions', question_records)
 
             logger.info(f"Cached question pool {pool_id} in Supabase (Tier 2) with {len(questions)} questions")
             return True
@@ -346,14 +575,102 @@ class SupabaseService:
             logger.error(f"Error caching question pool in Supabase: {str(e)}")
             return False
 
+    def bulk_store_questions(self, question_records: List[Dict], upsert: bool = False) -> bool:
+        """
+        Load question rows with COPY over a direct Postgres connection (DATABASE_URL)
+
+        Returns False without writing anything when the path is unavailable
+        (no psycopg or DATABASE_URL), the load is below SUPABASE_COPY_MIN_ROWS
+        (COPY setup outweighs the gain), or the load fails and is rolled back;
+        callers then fall back to PostgREST. With `upsert`, rows are COPYed into a
+        temp table and merged on id.
+        """
+        if (not PSYCOPG_AVAILABLE or not Config.DATABASE_URL
+                or len(question_records) < Config.SUPABASE_COPY_MIN_ROWS):
+            return False
+
+        columns = list(question_records[0])
+        column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+        json_idx = [i for i, column in enumerate(columns) if column in QUESTION_JSON_COLUMNS]
+        try:
+            with psycopg.connect(Config.DATABASE_URL, **self._pg_connect_kwargs()) as conn:
+                with conn.cursor() as cur:
+                    target = sql.Identifier('questions')
+                    if upsert:
+                        cur.execute("CREATE TEMP TABLE questions_load (LIKE questions) ON COMMIT DROP")
+                        target = sql.Identifier('questions_load')
+
+                    with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN").format(target, column_list)) as copy:
+                        for record in question_records:
+                            row = [record.get(column) for column in columns]
+                            for i in json_idx:
+                                row[i] = Jsonb(row[i])
+                            copy.write_row(row)
+
+                    if upsert:
+                        updates = sql.SQL(', ').join(
+                            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+                            for column in columns if column != 'id'
+                        )
+                        cur.execute(sql.SQL(
+                            "INSERT INTO questions ({0}) SELECT {0} FROM questions_load "
+                            "ON CONFLICT (id) DO UPDATE SET {1}"
+                        ).format(column_list, updates))
+
+            logger.info(f"COPYed {len(question_records)} questions into Postgres")
+            return True
+
+        except Exception as e:
+            logger.warning(f"COPY of {len(question_records)} questions failed, using PostgREST: {str(e)}")
+            return False
+
+    @staticmethod
+    def _pg_connect_kwargs() -> Dict[str, Any]:
+        """
+        psycopg connection options for the configured SUPABASE_POOLER_MODE
+
+        The transaction pooler hands each transaction to any backend, so a
+        statement prepared on one is missing on the next; prepare_threshold=None
+        turns server-side prepared statements off there. Session mode keeps
+        psycopg's default.
+        """
+        if Config.SUPABASE_POOLER_MODE == 'transaction':
+            return {'prepare_threshold': None}
+        return {}
+
+    def _upsert_chunked(self, table: str, records: List[Dict]):
+        """
+        Upsert records in SUPABASE_INSERT_CHUNK_SIZE chunks; chunks are independent
+        and go out concurrently on io_executor (bounded by its worker count).
+        Nothing reads the rows back, so PostgREST is asked not to echo them
+        """
+        chunk_size = Config.SUPABASE_INSERT_CHUNK_SIZE
+        chunks = [records[start:start + chunk_size] for start in range(0, len(records), chunk_size)]
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                self.client.table(table).upsert(chunk, returning=ReturnMethod.minimal).execute()
+            return
+        # list() drains the map so the first failed chunk raises here
+        list(self.io_executor.map(
+            lambda chunk: self.client.table(table).upsert(chunk, returning=ReturnMethod.minimal).execute(),
+            chunks
+        ))
+
     def get_cached_question_pool(self, pool_id: str) -> Optional[Dict]:
         """
         Get cached question pool from Supabase (Tier 2)
-        Returns None if not found or expired
+        Returns None if not found or expired; hot pools are memoized per worker
         """
+        cached = self._tier2_pool_l1.get(pool_id)
+        if cached is not None:
+            return dict(cached)
         try:
-            # Get pool metadata
-            pool_result = self.client.table('question_pools').select('*').eq('id', pool_id).execute()
+            # Pool metadata with its questions embedded (pool_questions, see
+            # PERFORMANCE_MIGRATION.sql): one request instead of two. Expired
+            # pools are filtered out by Postgres and come back as a miss.
+            pool_result = self.client.table('question_pools').select(
+                f"*,pool_questions({POOL_QUESTION_COLUMNS})"
+            ).eq('id', pool_id).gt('expires_at', self._utc_now()).execute()
 
             if not pool_result.data:
                 logger.info(f"Cache MISS (Supabase): pool {pool_id}")
@@ -361,63 +678,107 @@ class SupabaseService:
 
             pool_meta = pool_result.data[0]
 
-            # Check if cache expired
-            expires_at = float(pool_meta.get('expires_at', 0))
-            if expires_at < datetime.now().timestamp():
-                logger.info(f"Cache EXPIRED (Supabase): pool {pool_id}")
-                # Optionally delete expired cache
-                self.invalidate_question_pool(pool_id)
-                return None
-
-            # Get questions for this pool
-            questions_result = self.client.table('questions').select('*').eq('pool_id', pool_id).execute()
-
-            questions = []
-            for row in questions_result.data:
-                questions.append({
-                    'id': row['id'],
-                    'content': row['content'],
-                    'options': row['options'],
-                    'correct_answer': row['correct_answer'],
-                    'concepts': row.get('concepts', [1, 0, 0, 0, 0]),
-                    'difficulty': row.get('difficulty', 0.5),
-                    'discrimination': row.get('discrimination', 1.0),
-                    'guessing': row.get('guessing', 0.25),
-                    'topic_id': row.get('topic_id'),
-                    'chapter_id': row.get('chapter_id'),
-                    'subject_id': row.get('subject_id'),
-                    'class_id': row.get('class_id'),
-                    'exam_id': row.get('exam_id')
-                })
-
-            # Reconstruct pool data
-            pool_data = {
-                'pool_id': pool_id,
-                'level': pool_meta.get('level'),
-                'level_id': pool_meta.get('level_id'),
-                'attribute_count': pool_meta.get('attribute_count', 0),
-                'attributes': pool_meta.get('attributes', []),
-                'questions': questions,
-                'total_questions': len(questions),
-                'metadata': pool_meta.get('metadata', {}),
-                'cache_tier': 'supabase',
-                'cached_at': pool_meta.get('cached_at')
-            }
+            # The projected rows already are internal-format questions, so they are
+            # used as-is instead of being copied field by field
+            questions = pool_meta.pop('pool_questions', None) or []
 
             logger.info(f"Cache HIT (Supabase): pool {pool_id} with {len(questions)} questions")
-            return pool_data
+            pool = self._pool_from_rows(pool_meta, questions)
+            self._tier2_pool_l1[pool_id] = pool
+            return dict(pool)
 
         except Exception as e:
             logger.error(f"Error getting cached pool from Supabase: {str(e)}")
             return None
 
+    def get_cached_question_pools(self, pool_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Get several cached question pools from Supabase (Tier 2)
+        One metadata query, then question queries batched (and paged) by
+        SUPABASE_MAX_ROWS rows; only live hits are returned
+        """
+        found = {pool_id: dict(self._tier2_pool_l1[pool_id])
+                 for pool_id in pool_ids if pool_id in self._tier2_pool_l1}
+        pool_ids = [pool_id for pool_id in pool_ids if pool_id not in found]
+        if not pool_ids:
+            return found
+        try:
+            pool_result = self.client.table('question_pools').select('*').in_(
+                'id', pool_ids
+            ).gt('expires_at', self._utc_now()).execute()
+            live = {meta['id']: meta for meta in pool_result.data}
+
+            # Group pools so each questions query stays under the max-rows cap
+            batches, batch, batch_rows = [], [], 0
+            for pool_id, meta in live.items():
+                rows = int(meta.get('total_questions') or 0)
+                if batch and batch_rows + rows > Config.SUPABASE_MAX_ROWS:
+                    batches.append(batch)
+                    batch, batch_rows = [], 0
+                batch.append(pool_id)
+                batch_rows += rows
+            if batch:
+                batches.append(batch)
+
+            # Each batch is still paged with .range(): a single pool larger than the
+            # cap (or a stale total_questions) must not come back truncated
+            questions_by_pool = {pool_id: [] for pool_id in live}
+            page_size = Config.SUPABASE_MAX_ROWS
+            for batch in batches:
+                start = 0
+                while True:
+                    questions_result = self.client.table('questions').select(
+                        f"{POOL_QUESTION_COLUMNS},pool_id"
+                    ).in_('pool_id', batch).order('id').range(start, start + page_size - 1).execute()
+                    for row in questions_result.data:
+                        questions_by_pool[row.pop('pool_id')].append(row)
+                    if len(questions_result.data) < page_size:
+                        break
+                    start += page_size
+
+            logger.info(f"Cache HIT (Supabase): {len(live)}/{len(pool_ids)} pools")
+            for pool_id, meta in live.items():
+                pool = self._pool_from_rows(meta, questions_by_pool[pool_id])
+                self._tier2_pool_l1[pool_id] = pool
+                found[pool_id] = dict(pool)
+            return found
+
+        except Exception as e:
+            logger.error(f"Error getting cached pools from Supabase: {str(e)}")
+            return found
+
+    @staticmethod
+    def _utc_now() -> str:
+        """Current time as an ISO-8601 UTC string, comparable with timestamptz columns"""
+        return datetime.now(timezone.utc).isoformat()
+
+    @staticmethod
+    def _pool_from_rows(pool_meta: Dict, questions: List[Dict]) -> Dict:
+        """Reconstruct pool data from its question_pools row and question rows"""
+        return {
+            'pool_id': pool_meta['id'],
+            'level': pool_meta.get('level'),
+            'level_id': pool_meta.get('level_id'),
+            'attribute_count': pool_meta.get('attribute_count', 0),
+            'attributes': pool_meta.get('attributes', []),
+            'questions': questions,
+            'total_questions': len(questions),
+            'metadata': pool_meta.get('metadata', {}),
+            'cache_tier': 'supabase',
+            'cached_at': pool_meta.get('cached_at')
+        }
+
+    def evict_cached_pool(self, pool_id: str) -> None:
+        """Drop a pool from this worker's Tier 2 memo (the rows stay in Supabase)"""
+        self._tier2_pool_l1.pop(pool_id, None)
+
     def invalidate_question_pool(self, pool_id: str) -> bool:
         """Invalidate/delete question pool from Supabase cache"""
+        self._tier2_pool_l1.pop(pool_id, None)
         try:
-            # Delete questions
-            self.client.table('questions').delete().eq('pool_id', pool_id).execute()
-            # Delete pool metadata
-            self.client.table('question_pools').delete().eq('id', pool_id).execute()
+            # Delete questions and pool metadata in one transaction (invalidate_pool,
+            # see PERFORMANCE_MIGRATION.sql)
+            self.client.rpc('invalidate_pool', {'p_id': pool_id}).execute()
 
             logger.info(f"Invalidated question pool {pool_id} from Supabase")
             return True
@@ -429,23 +790,32 @@ class SupabaseService:
     def store_questions(self, pool_id: str, questions: List[Dict]) -> bool:
         """Store question pool in database (legacy method for backwards compatibility)"""
         try:
-            # Prepare question records
-            question_records = []
-            for question in questions:
-                question_records.append({
-                    'id': question['id'],
-                    'pool_id': pool_id,
-                    'content': question['content'],
-                    'options': question.get('options', []),
-                    'correct_answer': question['correct_answer'],
-                    'concepts': question.get('concepts', [1, 0, 0, 0, 0]),
-                    'difficulty': question.get('difficulty', 0.5),
-                    'discrimination': question.get('discrimination', 1.0),
-                    'created_at': datetime.now().isoformat()
-                })
-
-            # Insert questions into database
-            result = self.client.table('questions').insert(question_records).execute()
+            # Prepare question records (created_at is the column default)
+            question_records = [{
+                'id': question['id'],
+                'pool_id': pool_id,
+                'content': question['content'],
+                'options': question.get('options', []),
+                'correct_answer': question['correct_answer'],
+                'concepts': question.get('concepts', [1, 0, 0, 0, 0]),
+                'difficulty': question.get('difficulty', 0.5),
+                'discrimination': question.get('discrimination', 1.0)
+            } for question in questions]
+
+            # COPY large uploads directly (one transaction); otherwise insert in
+            # bounded chunks so they stay under request size limits
+            if not self.bulk_store_questions(question_records):
+                chunk_size = Config.SUPABASE_INSERT_CHUNK_SIZE
+                try:
+                    for start in range(0, len(question_records), chunk_size):
+                        self.client.table('questions').insert(
+                            question_records[start:start + chunk_size], returning=ReturnMethod.minimal
+                        ).execute()
+                except Exception:
+                    # The caller never gets this pool_id, so chunks already in
+                    # would be orphaned rows; every pool_id here is a fresh upload
+                    self._delete_partial_pool(pool_id)
+                    raise
             logger.info(f"Stored {len(questions)} questions in pool {pool_id}")
             return True
 
@@ -453,24 +823,22 @@ class SupabaseService:
             logger.error(f"Error storing questions: {str(e)}")
             return False
 
+    def _delete_partial_pool(self, pool_id: str) -> None:
+        """Delete the questions a failed chunked upload left under pool_id"""
+        try:
+            # A DELETE by pool_id is idempotent, so it can be retried like a read
+            self._execute_with_retry(lambda: self.client.table('questions').delete(
+                returning=ReturnMethod.minimal
+            ).eq('pool_id', pool_id).execute())
+            logger.info(f"Removed partially stored questions of pool {pool_id}")
+        except Exception as e:
+            logger.error(f"Error removing partially stored pool {pool_id}: {str(e)}")
+
     def get_questions_by_pool(self, pool_id: str) -> List[Dict]:
         """Get all questions from a specific pool"""
         try:
-            result = self.client.table('questions').select('*').eq('pool_id', pool_id).execute()
-
-            questions = []
-            for row in result.data:
-                questions.append({
-                    'id': row['id'],
-                    'content': row['content'],
-                    'options': row['options'],
-                    'correct_answer': row['correct_answer'],
-                    'concepts': row['concepts'],
-                    'difficulty': row.get('difficulty', 0.5),
-                    'discrimination': row.get('discrimination', 1.0)
-                })
-
-            return questions
+            result = self.client.table('questions').select(QUESTION_COLUMNS).eq('pool_id', pool_id).execute()
+            return [self._question_from_row(row) for row in result.data]
 
         except Exception as e:
             logger.error(f"Error getting questions from pool {pool_id}: {str(e)}")
@@ -479,19 +847,10 @@ class SupabaseService:
     def get_question_by_id(self, question_id: str) -> Optional[Dict]:
         """Get a specific question by ID"""
         try:
-            result = self.client.table('questions').select('*').eq('id', question_id).execute()
+            result = self.client.table('questions').select(QUESTION_COLUMNS).eq('id', question_id).execute()
 
             if result.data:
-                row = result.data[0]
-                return {
-                    'id': row['id'],
-                    'content': row['content'],
-                    'options': row['options'],
-                    'correct_answer': row['correct_answer'],
-                    'concepts': row['concepts'],
-                    'difficulty': row.get('difficulty', 0.5),
-                    'discrimination': row.get('discrimination', 1.0)
-                }
+                return self._question_from_row(result.data[0])
 
             return None
 
@@ -499,10 +858,44 @@ class SupabaseService:
             logger.error(f"Error getting question {question_id}: {str(e)}")
             return None
 
+    def get_questions_by_ids(self, question_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Get several questions by ID, one `in` query per SUPABASE_MAX_ROWS ids
+        Returns the questions found keyed by id
+        """
+        questions = {}
+        try:
+            for start in range(0, len(question_ids), Config.SUPABASE_MAX_ROWS):
+                batch = question_ids[start:start + Config.SUPABASE_MAX_ROWS]
+                result = self.client.table('questions').select(QUESTION_COLUMNS).in_('id', batch).execute()
+                for row in result.data:
+                    questions[row['id']] = self._question_from_row(row)
+            return questions
+
+        except Exception as e:
+            logger.error(f"Error getting {len(question_ids)} questions: {str(e)}")
+            return questions
+
+    def _question_from_row(self, row: Dict) -> Dict:
+        """Question dict from a `questions` table row"""
+        return {
+            'id': row['id'],
+            'content': row['content'],
+            'options': row['options'],
+            'correct_answer': row['correct_answer'],
+            'concepts': row['concepts'],
+            'difficulty': row.get('difficulty', 0.5),
+            'discrimination': row.get('discrimination', 1.0)
+        }
+
     # Session Management Methods (Database)
     def create_session(self, session_id: str, student_id: str, question_pool_id: str,
-                      initial_proficiency: List[float]) -> bool:
-        """Create a new test session record in database"""
+                      initial_proficiency: List[float]) -> Optional[Dict]:
+        """
+        Create a new test session record in database
+        Returns the inserted row as PostgREST sent it back (None on failure), so
+        callers need no get_session round-trip for it
+        """
         try:
             session_data = {
                 'id': session_id,
@@ -511,18 +904,21 @@ class SupabaseService:
                 'status': 'active',
                 'initial_proficiency': initial_proficiency,
                 'total_questions': 0,
-                'correct_responses': 0,
-                'started_at': datetime.now().isoformat(),
-                'last_activity': datetime.now().isoformat()
+                'correct_responses': 0
+                # started_at/last_activity: column defaults, stamped by Postgres
             }
 
-            result = self.client.table('test_sessions').insert(session_data).execute()
+            # A plain insert: only retried when the request never went out
+            result = self._execute_with_retry(
+                lambda: self.client.table('test_sessions').insert(session_data).execute(),
+                idempotent=False
+            )
             logger.info(f"Created session {session_id} for student {student_id}")
-            return True
+            return result.data[0] if result.data else session_data
 
         except Exception as e:
             logger.error(f"Error creating session: {str(e)}")
-            return False
+            return None
 
     def get_session(self, session_id: str) -> Optional[Dict]:
         """Get session from database"""
@@ -541,7 +937,9 @@ class SupabaseService:
                 'last_activity': datetime.now().isoformat()
             }
 
-            self.client.table('test_sessions').update(update_data).eq('id', session_id).execute()
+            self.client.table('test_sessions').update(
+                update_data, returning=ReturnMethod.minimal
+            ).eq('id', session_id).execute()
             return True
 
         except Exception as e:
@@ -563,10 +961,29 @@ class SupabaseService:
                 'completed_at': datetime.now().isoformat()
             }
 
-            self.client.table('test_sessions').update(update_data).eq('id', session_id).execute()
+            self._execute_with_retry(
+                lambda: self.client.table('test_sessions').update(
+                    update_data, returning=ReturnMethod.minimal
+                ).eq('id', session_id).execute()
+            )
             logger.info(f"Completed session {session_id}")
             return True
 
         except Exception as e:
             logger.error(f"Error completing session: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+# One SupabaseService (and so one Supabase client and its HTTP connection pool)
+# per process; every caller shares it instead of constructing its own
+_instance: Optional[SupabaseService] = None
+_instance_lock = threading.Lock()
+
+
+def get_supabase_service() -> SupabaseService:
+    """The process-wide SupabaseService, created on first use"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = SupabaseService()
+    return _instance
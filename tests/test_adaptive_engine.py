@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from app.models.adaptive_engine import AdaptiveEngine
+
+def _pool():
+    rng = np.random.default_rng(0)
+    questions = [
+        {
+            'id': f'q{i}',
+            'concepts': rng.integers(0, 2, 5).tolist(),
+            'difficulty': float(rng.normal()),
+            'discrimination': float(rng.uniform(0.5, 2.0))
+        }
+        for i in range(50)
+    ]
+    q_matrix = {q['id']: q['concepts'] for q in questions}
+    return questions, q_matrix
+
+def test_select_next_question_matches_scalar_information():
+    """Batched selection picks the same question as scoring each one"""
+    engine = AdaptiveEngine()
+    questions, q_matrix = _pool()
+    proficiency = [0.3, -0.2, 0.1, 0.0, 0.5]
+    answered_ids = ['q3', 'q7']
+
+    available = [q for q in questions if q['id'] not in {'q3', 'q7'}]
+
+    def information(question):
+        prob = engine._calculate_probability(proficiency, question, q_matrix)
+        return question['discrimination'] ** 2 * prob * (1 - prob)
+
+    expected = max(available, key=information)
+
+    assert engine.select_next_question(questions, q_matrix, proficiency, answered_ids)['id'] == expected['id']
+
+def test_select_next_question_skips_used_questions():
+    """Every question is eventually used exactly once"""
+    engine = AdaptiveEngine()
+    questions, q_matrix = _pool()
+    answered_ids = []
+    for _ in questions:
+        question = engine.select_next_question(questions, q_matrix, [0.0] * 5, answered_ids)
+        answered_ids.append(question['id'])
+
+    assert len(set(answered_ids)) == len(questions)
+    assert engine.select_next_question(questions, q_matrix, [0.0] * 5, answered_ids) == {}
+
+def test_update_ability_moves_towards_response():
+    """A correct answer raises proficiency on the question's concepts only"""
+    engine = AdaptiveEngine()
+    question = {'id': 'q1', 'concepts': [1, 0, 0, 0, 0], 'difficulty': 0.0, 'discrimination': 1.0}
+    q_matrix = {'q1': question['concepts']}
+
+    updated = engine.update_ability([0.0] * 5, question, 1, q_matrix)
+
+    assert updated[0] > 0.0
+    assert updated[1:].tolist() == [0.0] * 4
+
+def test_summarize_responses_matches_running_summary():
+    """Rebuilding a summary from history equals recording responses one by one"""
+    engine = AdaptiveEngine()
+    responses = [
+        {'question_id': f'q{i}', 'response': i % 2, 'proficiency_after': [0.1 * i] * 5}
+        for i in range(8)
+    ]
+
+    running = engine.empty_summary()
+    for r in responses:
+        engine.record_response(running, r['question_id'], r['response'], r['proficiency_after'])
+
+    assert engine.summarize_responses(responses) == running
+    assert running['n'] == 8 and running['n_correct'] == 4
+    assert len(running['recent_proficiencies']) == 5
+
+def test_with_response_leaves_the_input_summary_untouched():
+    """with_response records into a copy, so a failed submit can reuse what it read"""
+    engine = AdaptiveEngine()
+    summary = engine.record_response(engine.empty_summary(), 'q0', 1, [0.5] * 5)
+
+    updated = engine.with_response(summary, 'q1', 0, [0.4] * 5)
+
+    assert summary == {'n': 1, 'n_correct': 1, 'question_ids': ['q0'], 'recent_proficiencies': [[0.5] * 5]}
+    assert updated['n'] == 2 and updated['question_ids'] == ['q0', 'q1']
+
+def test_update_ability_with_pool_arrays_matches_q_matrix_path():
+    """Reading item parameters from the pool arrays gives the same update"""
+    engine = AdaptiveEngine()
+    questions, q_matrix = _pool()
+    pool = engine.pool_arrays(questions, q_matrix, 5)
+    proficiency = [0.3, -0.2, 0.1, 0.0, 0.5]
+
+    for question in questions[:10]:
+        expected = engine.update_ability(proficiency, question, 1, q_matrix)
+        assert np.allclose(engine.update_ability(proficiency, question, 1, q_matrix, pool), expected)
+
+def test_estimate_precision_matches_per_concept_variance():
+    """Precision is 1 / (1 + mean per-concept variance of the recent estimates)"""
+    engine = AdaptiveEngine()
+    rng = np.random.default_rng(1)
+    summary = engine.empty_summary()
+    for i in range(7):
+        engine.record_response(summary, f'q{i}', 1, rng.normal(size=5).tolist())
+
+    recent = summary['recent_proficiencies']
+    expected = 1.0 / (1.0 + np.mean([np.var([p[k] for p in recent]) for k in range(5)]))
+
+    assert np.isclose(engine._estimate_precision(summary, [0.0] * 5), expected, rtol=1e-5)
+
+def test_generate_summary_aggregates():
+    """Accuracy and efficiency are computed over the recorded responses"""
+    engine = AdaptiveEngine()
+    responses = [
+        {'response': 1, 'proficiency_before': [0.0, 0.0], 'proficiency_after': [0.3, 0.4]},
+        {'response': 0, 'proficiency_before': [0.3, 0.4], 'proficiency_after': [0.3, 0.4]},
+        {'response': 1, 'proficiency_before': [], 'proficiency_after': [0.3, 0.4]},
+    ]
+
+    summary = engine.generate_summary({
+        'responses': responses,
+        'initial_proficiency': [0.0, 0.0],
+        'current_proficiency': [0.3, 0.4]
+    })
+
+    assert summary['correct_responses'] == 2
+    assert np.isclose(summary['accuracy'], 2 / 3)
+    assert np.isclose(summary['test_efficiency'], 0.25 / 3)
+
+def test_pool_arrays_rejects_mismatched_q_matrix_rows():
+    """A Q-matrix row with the wrong number of concepts fails at pool load"""
+    engine = AdaptiveEngine()
+    questions, q_matrix = _pool()
+    q_matrix['q4'] = [1, 0]
+
+    with pytest.raises(ValueError):
+        engine.pool_arrays(questions, q_matrix, 5)
@@ -0,0 +1,115 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')  # fakeredis needs it to run the Lua scripts
+import redis
+
+# The services import their siblings as top-level modules (`from config import Config`)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'app'))
+from services import redis_service as rs
+
+def _state():
+    return {
+        'student_id': 's1',
+        'question_pool_id': 'pool_1',
+        'current_proficiency': [0.5, 0.5, 0.5],
+        'next_question_id': 'q1',
+        'status': 'active',
+        'questions_answered': 0,
+        'correct_count': 0,
+        'responses_summary': {'n': 0, 'n_correct': 0, 'question_ids': [], 'recent_proficiencies': []},
+        'end_criteria': {'type': 'fixed_length', 'max_questions': 20}
+    }
+
+@pytest.fixture
+def service(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(rs, '_connection_pool', lambda decode_responses: redis.ConnectionPool(
+        connection_class=fakeredis.FakeRedisConnection, server=server, decode_responses=decode_responses
+    ))
+    return rs.RedisService()
+
+def test_session_state_round_trip(service):
+    """A stored state comes back field for field, with TTL and activity score set"""
+    state = _state()
+    assert service.store_session_state('abc', dict(state))
+
+    loaded = service.get_session_state('abc')
+    assert {k: loaded[k] for k in state} == state
+    assert 0 < service.client.ttl('session:abc:state') <= rs.SESSION_TTL.total_seconds()
+    assert service.client.zscore(rs.ACTIVITY_KEY, 'abc') == pytest.approx(loaded['last_activity'])
+
+def test_partial_update_keeps_the_other_fields(service):
+    """changed= rewrites only the listed fields and releases the submission lock"""
+    service.store_session_state('abc', _state())
+    assert service.acquire_submission_lock('abc', 'q1')
+
+    state = service.get_session_state('abc')
+    state['questions_answered'] = 1
+    state['current_proficiency'] = [0.6, 0.5, 0.5]
+    state['status'] = 'this local edit is not listed in changed'
+    assert service.store_session_and_release(
+        'abc', state, 'q1', changed=['questions_answered', 'current_proficiency']
+    )
+
+    loaded = service.get_session_state('abc')
+    assert loaded['questions_answered'] == 1
+    assert loaded['current_proficiency'] == [0.6, 0.5, 0.5]
+    assert loaded['status'] == 'active'
+    assert loaded['end_criteria'] == _state()['end_criteria']
+    assert not service.client.exists('lock:abc:q1')
+
+def test_partial_update_of_an_expired_session_writes_nothing(service):
+    """A session that disappeared mid-request is not recreated with a few fields"""
+    service.store_session_state('abc', _state())
+    state = service.get_session_state('abc')
+    service.acquire_submission_lock('abc', 'q1')
+    service.client.delete('session:abc:state')  # what TTL expiry or a cleanup sweep does
+
+    state['questions_answered'] = 1
+    assert not service.store_session_and_release('abc', state, 'q1', changed=['questions_answered'])
+
+    assert not service.client.exists('session:abc:state')
+    assert service.get_session_state('abc') is None
+    assert not service.client.exists('lock:abc:q1')
+
+def test_cleanup_removes_only_inactive_sessions(service):
+    """The sweep deletes sessions idle past the threshold, in batches, and then stops"""
+    for i in range(5):
+        service.store_session_state(f'old{i}', _state())
+    service.store_session_state('fresh', _state())
+    stale = time.time() - 3600
+    service.client.zadd(rs.ACTIVITY_KEY, {f'old{i}': stale for i in range(5)})
+
+    assert service.cleanup_inactive_sessions(inactivity_minutes=30, batch_size=2) == 5
+    assert service.get_session_state('fresh') is not None
+    assert service.get_session_state('old0') is None
+
+def test_cleanup_sweeps_past_sessions_whose_state_already_expired(service):
+    """A full batch of ids with no state left doesn't end the sweep early"""
+    service.store_session_state('old', _state())
+    stale = time.time() - 3600
+    service.client.zadd(rs.ACTIVITY_KEY, {f'gone{i}': stale for i in range(4)})  # state expired by TTL
+    service.client.zadd(rs.ACTIVITY_KEY, {'old': stale + 1})
+
+    assert service.cleanup_inactive_sessions(inactivity_minutes=30, batch_size=2) == 1
+    assert service.get_session_state('old') is None
+    assert service.client.zcard(rs.ACTIVITY_KEY) == 0
+
+def test_bulk_lock_acquire_reports_each_question(service):
+    """Locks already held come back False, the rest are taken with a TTL"""
+    assert service.acquire_submission_lock('abc', 'q2')
+
+    assert service.acquire_submission_locks_bulk('abc', ['q1', 'q2', 'q3']) == [True, False, True]
+    assert 0 < service.client.pttl('lock:abc:q1') <= 5000
+    assert service.release_submission_locks_bulk('abc', ['q1', 'q2', 'q3', 'q4']) == 3
+    assert not service.client.exists('lock:abc:q1', 'lock:abc:q2', 'lock:abc:q3')
+
+def test_bulk_lock_release_of_nothing(service):
+    """An empty list sends no DEL (which Redis would reject) and releases nothing"""
+    assert service.release_submission_locks_bulk('abc', []) == 0
+    assert service.acquire_submission_locks_bulk('abc', []) == []